@@ -0,0 +1,695 @@
+#
+# Copyright 2012 Ralf Kistner
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+
+"""
+Maximum flow.
+
+The residual graph is stored in flat lists: edge e goes to to[e] and has residual capacity cap[e], and its reverse
+edge is e ^ 1. adj[u] lists the edges out of node u. Nodes are the integers 0..n-1.
+
+For maximum bipartite matching, connect a source to every left node and every right node to a sink, all with
+capacity 1, and run max flow.
+"""
+
+
+class FlowNetwork(object):
+    """
+    A flow network with integer node ids.
+
+    >>> net = FlowNetwork(4)
+    >>> edges = [net.add_edge(u, v, c) for u, v, c in [(0, 1, 3), (0, 2, 2), (1, 2, 5), (1, 3, 2), (2, 3, 3)]]
+    >>> net.max_flow(0, 3)
+    5
+    >>> [net.flow(e) for e in edges]
+    [3, 2, 1, 2, 3]
+    """
+
+    def __init__(self, n, labels=None):
+        self.n = n
+        self.to = []
+        self.cap = []
+        self.capacity = []  # Original capacity of each edge, to compute the flow
+        self.adj = [[] for _ in range(n)]
+        self.labels = labels
+        self._ids = None
+
+    @classmethod
+    def from_graph(cls, graph):
+        """
+        Builds a network from a Graph such as a DirectedGraph, where edge weights are capacities.
+
+        Node ids are assigned in the order of graph.nodes(). Use node_id() and label() to convert.
+        """
+        labels = list(graph.nodes())
+        ids = {label: i for i, label in enumerate(labels)}
+        network = cls(len(labels), labels)
+        network._ids = ids
+        for label in labels:
+            u = ids[label]
+            for neighbour, capacity in graph.edges(label).items():
+                network.add_edge(u, ids[neighbour], capacity)
+        return network
+
+    def node_id(self, label):
+        if self.labels is None:
+            return label
+        if self._ids is None:
+            self._ids = {label: i for i, label in enumerate(self.labels)}
+        return self._ids[label]
+
+    def label(self, node):
+        if self.labels is None:
+            return node
+        return self.labels[node]
+
+    def add_edge(self, u, v, capacity, reverse_capacity=0):
+        """
+        Adds an edge u -> v. For an undirected edge, set reverse_capacity to capacity.
+
+        Returns the edge id. Its reverse edge is id ^ 1.
+        """
+        e = len(self.to)
+        self.to.append(v)
+        self.cap.append(capacity)
+        self.capacity.append(capacity)
+        self.adj[u].append(e)
+        self.to.append(u)
+        self.cap.append(reverse_capacity)
+        self.capacity.append(reverse_capacity)
+        self.adj[v].append(e + 1)
+        return e
+
+    def flow(self, e):
+        """ The current flow over edge e. Negative if the flow goes in the opposite direction. """
+        return self.capacity[e] - self.cap[e]
+
+    def flows(self):
+        """
+        The positive flows over the original edges, as {u: {v: flow}} using node labels. Flow that goes against an
+        edge added with a reverse_capacity is listed as v -> u.
+
+        >>> net = FlowNetwork(3)
+        >>> edges = net.add_edge(1, 0, 5, 5), net.add_edge(1, 2, 9)
+        >>> net.max_flow(0, 2)
+        5
+        >>> net.flows()
+        {0: {1: 5}, 1: {2: 5}}
+        """
+        result = {}
+        to = self.to
+        for e in range(0, len(to), 2):
+            f = self.capacity[e] - self.cap[e]
+            if f > 0:
+                u = self.label(to[e + 1])
+                v = self.label(to[e])
+            elif f < 0:
+                f = -f
+                u = self.label(to[e])
+                v = self.label(to[e + 1])
+            else:
+                continue
+            result.setdefault(u, {})
+            result[u][v] = result[u].get(v, 0) + f
+        return result
+
+    def reset(self):
+        """ Removes all flow. """
+        self.cap = list(self.capacity)
+
+    def max_flow(self, source, sink, algorithm='dinic'):
+        """
+        Increases the flow from source to sink to the maximum, and returns the amount of flow added.
+
+        algorithm is 'dinic' or 'push_relabel'.
+        """
+        if source == sink:
+            raise ValueError("Source and sink must be different")
+        if algorithm == 'dinic':
+            return dinic(self, source, sink)
+        elif algorithm == 'push_relabel':
+            return push_relabel(self, source, sink)
+        raise ValueError("Unknown algorithm %r" % algorithm)
+
+    def reachable(self, source):
+        """
+        The nodes reachable from source in the residual graph, as a bytearray indexed by node.
+
+        After a maximum flow, these form the source side of a minimum cut.
+        """
+        to = self.to
+        cap = self.cap
+        adj = self.adj
+        seen = bytearray(self.n)
+        seen[source] = 1
+        queue = [source]
+        for u in queue:
+            for e in adj[u]:
+                v = to[e]
+                if cap[e] > 0 and not seen[v]:
+                    seen[v] = 1
+                    queue.append(v)
+        return seen
+
+    def min_cut(self, source):
+        """
+        The edges of a minimum cut, read from the residual graph after max_flow() from source: the edges with
+        capacity going from a node reachable from source to one that is not. For an edge added with a
+        reverse_capacity, this may be the reverse edge e ^ 1. Their capacities add up to the flow.
+
+        >>> net = FlowNetwork(4)
+        >>> edges = [net.add_edge(u, v, c) for u, v, c in [(0, 1, 3), (0, 2, 2), (1, 2, 5), (1, 3, 2), (2, 3, 1)]]
+        >>> net.max_flow(0, 3)
+        3
+        >>> [(net.to[e ^ 1], net.to[e]) for e in net.min_cut(0)]
+        [(1, 3), (2, 3)]
+
+        An undirected edge 1 - 0 is cut in the direction 0 -> 1:
+
+        >>> net = FlowNetwork(3)
+        >>> edges = net.add_edge(1, 0, 5, 5), net.add_edge(1, 2, 9)
+        >>> net.max_flow(0, 2)
+        5
+        >>> [(net.to[e ^ 1], net.to[e], net.capacity[e]) for e in net.min_cut(0)]
+        [(0, 1, 5)]
+        """
+        seen = self.reachable(source)
+        to = self.to
+        capacity = self.capacity
+        return [e for e in range(len(to)) if capacity[e] > 0 and seen[to[e ^ 1]] and not seen[to[e]]]
+
+    def __repr__(self):
+        return "<FlowNetwork %d nodes, %d edges>" % (self.n, len(self.to) // 2)
+
+
+def _levels(network, source, sink):
+    """ BFS distances from source in the residual graph, or None if sink cannot be reached. """
+    to = network.to
+    cap = network.cap
+    adj = network.adj
+    level = [-1] * network.n
+    level[source] = 0
+    queue = [source]
+    for u in queue:
+        d = level[u] + 1
+        for e in adj[u]:
+            v = to[e]
+            if cap[e] > 0 and level[v] < 0:
+                level[v] = d
+                queue.append(v)
+    if level[sink] < 0:
+        return None
+    return level
+
+
+def dinic(network, source, sink):
+    """
+    Dinic's algorithm: repeatedly builds a BFS level graph, and sends a blocking flow through it with depth first
+    searches that never revisit a dead edge (the current arc optimisation). O(V^2 E) in general, and O(E sqrt(V)) for
+    unit capacity networks such as bipartite matching.
+
+    Returns the amount of flow added.
+
+    >>> net = FlowNetwork(6)
+    >>> for u, v, c in [(0, 1, 10), (0, 2, 10), (1, 2, 2), (1, 3, 4), (1, 4, 8), (2, 4, 9), (4, 3, 6), (3, 5, 10),
+    ...                 (4, 5, 10)]:
+    ...     e = net.add_edge(u, v, c)
+    >>> dinic(net, 0, 5)
+    19
+    """
+    to = network.to
+    cap = network.cap
+    adj = network.adj
+    total = 0
+    while True:
+        level = _levels(network, source, sink)
+        if level is None:
+            return total
+        current = [0] * network.n
+        # The path is kept as a stack of edges. After augmenting, the search resumes from the tail of the first
+        # saturated edge instead of from the source.
+        path = []
+        u = source
+        while True:
+            if u == sink:
+                f = min(cap[e] for e in path)
+                total += f
+                cut = None
+                for i, e in enumerate(path):
+                    cap[e] -= f
+                    cap[e ^ 1] += f
+                    if cut is None and cap[e] == 0:
+                        cut = i
+                del path[cut:]
+                u = to[path[-1]] if path else source
+                continue
+
+            edges = adj[u]
+            i = current[u]
+            lu = level[u] + 1
+            while i < len(edges):
+                e = edges[i]
+                if cap[e] > 0 and level[to[e]] == lu:
+                    break
+                i += 1
+            current[u] = i
+            if i < len(edges):
+                path.append(edges[i])
+                u = to[edges[i]]
+            else:
+                # Dead end: retreat and skip the edge that led here
+                if not path:
+                    break
+                level[u] = -1
+                e = path.pop()
+                u = to[e ^ 1]
+                current[u] += 1
+
+
+def push_relabel(network, source, sink):
+    """
+    Highest-label push-relabel with the gap heuristic. O(V^2 sqrt(E)).
+
+    Always discharges an active node with the highest label. When no node is left at some height below n, all nodes
+    above that height can no longer reach the sink, and are lifted above n at once.
+
+    Returns the amount of flow added.
+
+    >>> net = FlowNetwork(6)
+    >>> for u, v, c in [(0, 1, 10), (0, 2, 10), (1, 2, 2), (1, 3, 4), (1, 4, 8), (2, 4, 9), (4, 3, 6), (3, 5, 10),
+    ...                 (4, 5, 10)]:
+    ...     e = net.add_edge(u, v, c)
+    >>> push_relabel(net, 0, 5)
+    19
+    >>> sum(net.flow(e) for e in net.adj[5] if e % 2 == 1) == -19
+    True
+    """
+    n = network.n
+    to = network.to
+    cap = network.cap
+    adj = network.adj
+    height = [0] * n
+    excess = [0] * n
+    count = [0] * (2 * n + 1)
+    buckets = [[] for _ in range(2 * n + 1)]
+    current = [0] * n
+    height[source] = n
+    count[0] = n - 1
+    count[n] = 1
+    before = excess[sink]
+
+    for e in adj[source]:
+        f = cap[e]
+        if f > 0:
+            v = to[e]
+            cap[e] = 0
+            cap[e ^ 1] += f
+            excess[source] -= f
+            if excess[v] == 0 and v != sink:
+                buckets[0].append(v)
+            excess[v] += f
+    highest = 0
+
+    while highest >= 0:
+        if not buckets[highest]:
+            highest -= 1
+            continue
+        u = buckets[highest].pop()
+        if height[u] != highest:
+            # Lifted by the gap heuristic while waiting
+            buckets[height[u]].append(u)
+            highest = max(highest, height[u])
+            continue
+
+        # Discharge u
+        edges = adj[u]
+        while excess[u] > 0:
+            i = current[u]
+            if i == len(edges):
+                # Relabel
+                old = height[u]
+                h = 2 * n
+                for e in edges:
+                    if cap[e] > 0 and height[to[e]] < h:
+                        h = height[to[e]]
+                h += 1
+                count[old] -= 1
+                if count[old] == 0 and old < n:
+                    # Gap: nothing between old and n can reach the sink any more
+                    for v in range(n):
+                        if old < height[v] < n:
+                            count[height[v]] -= 1
+                            height[v] = n + 1
+                            count[n + 1] += 1
+                    h = max(h, n + 1)
+                height[u] = h
+                count[h] += 1
+                current[u] = 0
+                continue
+            e = edges[i]
+            v = to[e]
+            if cap[e] > 0 and height[u] == height[v] + 1:
+                f = min(excess[u], cap[e])
+                cap[e] -= f
+                cap[e ^ 1] += f
+                excess[u] -= f
+                if excess[v] == 0 and v != source and v != sink:
+                    buckets[height[v]].append(v)
+                excess[v] += f
+            else:
+                current[u] = i + 1
+        # Pushes from u may have activated nodes just below its final height
+        highest = max(highest, height[u])
+
+    return excess[sink] - before
+
+
+def max_flow(graph, source, sink, algorithm='dinic'):
+    """
+    Maximum flow from source to sink in a Graph such as a DirectedGraph, where edge weights are capacities.
+
+    Returns (value, flows), where flows is {u: {v: flow}} for every edge with positive flow.
+
+    >>> from graph import DirectedGraph
+    >>> g = DirectedGraph({'s': {'a': 3, 'b': 2}, 'a': {'b': 5, 't': 2}, 'b': {'t': 3}})
+    >>> value, flows = max_flow(g, 's', 't')
+    >>> value
+    5
+    >>> sorted(flows['s'].items())
+    [('a', 3), ('b', 2)]
+    >>> max_flow(g, 's', 't', algorithm='push_relabel')[0]
+    5
+    """
+    network = FlowNetwork.from_graph(graph)
+    value = network.max_flow(network.node_id(source), network.node_id(sink), algorithm)
+    return value, network.flows()
+
+
+def min_cut(graph, source, sink, algorithm='dinic'):
+    """
+    Minimum cut between source and sink in a Graph such as a DirectedGraph, where edge weights are capacities.
+    Needs a single max flow run.
+
+    Returns (value, side, edges), where side is the set of nodes on the source side, and edges lists the cut edges
+    as (u, v) pairs.
+
+    >>> from graph import DirectedGraph
+    >>> g = DirectedGraph({'s': {'a': 3, 'b': 2}, 'a': {'b': 5, 't': 2}, 'b': {'t': 1}})
+    >>> value, side, edges = min_cut(g, 's', 't')
+    >>> value, sorted(side), sorted(edges)
+    (3, ['a', 'b', 's'], [('a', 't'), ('b', 't')])
+    """
+    network = FlowNetwork.from_graph(graph)
+    s = network.node_id(source)
+    value = network.max_flow(s, network.node_id(sink), algorithm)
+    seen = network.reachable(s)
+    side = {network.label(u) for u in range(network.n) if seen[u]}
+    edges = [(network.label(network.to[e ^ 1]), network.label(network.to[e])) for e in network.min_cut(s)]
+    return value, side, edges
+
+
+class GomoryHuTree(object):
+    """
+    A tree over the nodes of an undirected network, such that the minimum cut between any two nodes is the smallest
+    edge weight on the tree path between them. Built with Gusfield's algorithm, using n - 1 max flow runs on the
+    original network instead of one per pair.
+
+    The network must be undirected: every edge needs the same capacity in both directions, as with
+    FlowNetwork.add_edge(u, v, c, c), or FlowNetwork.from_graph() on an UndirectedGraph.
+
+    parent[u] and weight[u] describe the tree edge from node u to its parent. Node 0 is the root, and every parent
+    has a smaller id than its children.
+
+    >>> from graph import UndirectedGraph
+    >>> g = UndirectedGraph({1: {2: 1, 3: 7}, 2: {3: 1, 4: 3}, 3: {4: 4}, 4: {5: 2}, 5: {6: 2}, 6: {4: 2}})
+    >>> tree = GomoryHuTree(FlowNetwork.from_graph(g))
+    >>> tree.min_cut(1, 3), tree.min_cut(2, 4), tree.min_cut(1, 6)
+    (8, 5, 4)
+    """
+
+    def __init__(self, network):
+        n = network.n
+        self.network = network
+        self.parent = [0] * n
+        self.weight = [0] * n
+        for u in range(1, n):
+            network.reset()
+            t = self.parent[u]
+            self.weight[u] = network.max_flow(u, t)
+            seen = network.reachable(u)
+            for v in range(u + 1, n):
+                if seen[v] and self.parent[v] == t:
+                    self.parent[v] = u
+        network.reset()
+        self.depth = [0] * n
+        for u in range(1, n):
+            self.depth[u] = self.depth[self.parent[u]] + 1
+
+    def min_cut(self, u, v):
+        """ The minimum cut value between two nodes, given as labels of the network. """
+        u = self.network.node_id(u)
+        v = self.network.node_id(v)
+        parent = self.parent
+        weight = self.weight
+        depth = self.depth
+        result = float('inf')
+        while u != v:
+            if depth[u] < depth[v]:
+                u, v = v, u
+            result = min(result, weight[u])
+            u = parent[u]
+        return result
+
+    def edges(self):
+        """ The tree edges as (node, parent, weight), using labels of the network. """
+        label = self.network.label
+        return [(label(u), label(self.parent[u]), self.weight[u]) for u in range(1, self.network.n)]
+
+
+class MinCostFlowNetwork(FlowNetwork):
+    """
+    A flow network where every edge also has a cost per unit of flow. The reverse of edge e has cost -cost[e].
+
+    >>> net = MinCostFlowNetwork(4)
+    >>> for u, v, c, w in [(0, 1, 2, 1), (0, 2, 1, 5), (1, 2, 1, 1), (1, 3, 1, 6), (2, 3, 2, 1)]:
+    ...     e = net.add_edge(u, v, c, cost=w)
+    >>> net.min_cost_flow(0, 3)
+    (3, 16)
+    >>> net.reset()
+    >>> net.min_cost_flow(0, 3, limit=1)
+    (1, 3)
+    >>> net.reset()
+    >>> net.min_cost_flow(0, 3, scaling=True)
+    (3, 16)
+    """
+
+    def __init__(self, n, labels=None):
+        super(MinCostFlowNetwork, self).__init__(n, labels)
+        self.cost = []
+
+    def add_edge(self, u, v, capacity, *, cost=0):
+        """
+        Adds an edge u -> v with the given cost per unit of flow. Returns the edge id.
+
+        cost is keyword-only, since the fourth argument of FlowNetwork.add_edge() is the reverse capacity. Edges here
+        are always directed: the reverse edge only carries flow back.
+        """
+        e = super(MinCostFlowNetwork, self).add_edge(u, v, capacity)
+        self.cost.append(cost)
+        self.cost.append(-cost)
+        return e
+
+    def total_cost(self):
+        """ The cost of the current flow. """
+        cost = self.cost
+        capacity = self.capacity
+        cap = self.cap
+        return sum((capacity[e] - cap[e]) * cost[e] for e in range(0, len(cost), 2))
+
+    def min_cost_flow(self, source, sink, limit=None, scaling=False):
+        """
+        Sends as much flow as possible from source to sink, up to limit if given, at the lowest total cost.
+
+        By default this uses successive shortest paths: each augmenting path is found with Dijkstra's algorithm on
+        costs reduced by node potentials (Johnson's technique), which keeps them non-negative, so Bellman-Ford is
+        only needed once at the start if there are negative costs. There may not be negative cost cycles.
+
+        With scaling=True, capacity scaling is used instead, which needs O(log U) rounds for a largest capacity U
+        rather than one Dijkstra run per augmenting path, and also handles negative cost cycles.
+
+        Returns (flow, cost) for the flow added.
+        """
+        before = self.total_cost()
+        if scaling:
+            flow = _min_cost_flow_scaling(self, source, sink, limit)
+        else:
+            flow = _min_cost_flow_ssp(self, source, sink, limit)
+        return flow, self.total_cost() - before
+
+
+def _reduced_dijkstra(network, sources, potential, min_cap=1):
+    """
+    Dijkstra's algorithm from all sources at once over the residual edges with capacity >= min_cap, using the costs
+    reduced by the potentials, which must be non-negative on those edges.
+
+    Returns (dist, pred), where pred[v] is the edge used to reach v, or -1.
+    """
+    import heapq
+
+    to = network.to
+    cap = network.cap
+    cost = network.cost
+    adj = network.adj
+    inf = float('inf')
+    dist = [inf] * network.n
+    pred = [-1] * network.n
+    queue = []
+    for s in sources:
+        dist[s] = 0
+        queue.append((0, s))
+    heapq.heapify(queue)
+    while queue:
+        d, u = heapq.heappop(queue)
+        if d > dist[u]:
+            continue
+        pu = potential[u]
+        for e in adj[u]:
+            if cap[e] < min_cap:
+                continue
+            v = to[e]
+            total = d + cost[e] + pu - potential[v]
+            if total < dist[v]:
+                dist[v] = total
+                pred[v] = e
+                heapq.heappush(queue, (total, v))
+    return dist, pred
+
+
+def _min_cost_flow_ssp(network, source, sink, limit):
+    to = network.to
+    cap = network.cap
+    cost = network.cost
+    n = network.n
+    inf = float('inf')
+    potential = [0] * n
+
+    if any(cost[e] < 0 and cap[e] > 0 for e in range(len(cost))):
+        # Bellman-Ford from the source for the initial potentials. The queue is FIFO, which keeps it O(VE).
+        from collections import deque
+
+        dist = [inf] * n
+        dist[source] = 0
+        queue = deque([source])
+        queued = bytearray(n)
+        queued[source] = 1
+        while queue:
+            u = queue.popleft()
+            queued[u] = 0
+            for e in network.adj[u]:
+                if cap[e] > 0 and dist[u] + cost[e] < dist[to[e]]:
+                    dist[to[e]] = dist[u] + cost[e]
+                    if not queued[to[e]]:
+                        queued[to[e]] = 1
+                        queue.append(to[e])
+        potential = [d if d < inf else 0 for d in dist]
+
+    flow = 0
+    while limit is None or flow < limit:
+        dist, pred = _reduced_dijkstra(network, [source], potential)
+        if dist[sink] == inf:
+            break
+        for v in range(n):
+            if dist[v] < inf:
+                potential[v] += dist[v]
+        f = inf if limit is None else limit - flow
+        v = sink
+        while v != source:
+            e = pred[v]
+            f = min(f, cap[e])
+            v = to[e ^ 1]
+        v = sink
+        while v != source:
+            e = pred[v]
+            cap[e] -= f
+            cap[e ^ 1] += f
+            v = to[e ^ 1]
+        flow += f
+    return flow
+
+
+def _min_cost_flow_scaling(network, source, sink, limit):
+    """
+    Capacity scaling on the circulation with an extra edge sink -> source, whose capacity is the limit and whose cost
+    is negative enough that maximising the flow always comes first.
+    """
+    to = network.to
+    cap = network.cap
+    cost = network.cost
+    adj = network.adj
+    n = network.n
+    inf = float('inf')
+
+    if limit is None:
+        limit = sum(cap[e] for e in adj[source] if e % 2 == 0)
+    big = 1 + sum(abs(c) for c in cost) // 2
+    back = network.add_edge(sink, source, limit, cost=-big)
+
+    potential = [0] * n
+    excess = [0] * n
+    delta = 1
+    while delta * 2 <= max(cap):
+        delta *= 2
+    while delta >= 1:
+        # Saturate every edge in the delta-residual graph with negative reduced cost
+        for u in range(n):
+            for e in adj[u]:
+                c = cap[e]
+                if c >= delta and cost[e] + potential[u] - potential[to[e]] < 0:
+                    cap[e] = 0
+                    cap[e ^ 1] += c
+                    excess[u] -= c
+                    excess[to[e]] += c
+        while True:
+            sources = [u for u in range(n) if excess[u] >= delta]
+            if not sources:
+                break
+            dist, pred = _reduced_dijkstra(network, sources, potential, delta)
+            target = -1
+            for v in range(n):
+                if excess[v] <= -delta and dist[v] < inf and (target < 0 or dist[v] < dist[target]):
+                    target = v
+            if target < 0:
+                break
+            d = dist[target]
+            for v in range(n):
+                potential[v] += min(dist[v], d)
+            v = target
+            while pred[v] >= 0:
+                e = pred[v]
+                cap[e] -= delta
+                cap[e ^ 1] += delta
+                v = to[e ^ 1]
+            excess[v] -= delta
+            excess[target] += delta
+        delta //= 2
+
+    flow = network.capacity[back] - cap[back]
+    # Remove the extra edge again
+    for lst in (network.to, network.cap, network.capacity, network.cost):
+        del lst[back:]
+    adj[sink].pop()
+    adj[source].pop()
+    return flow
@@ -34,10 +34,30 @@ class GeometryException(Exception):
     pass
 
 
-class Vector:
+class Vector(object):
+    """
+    An immutable point or direction. Instances only hold the two slots x and y, without an instance dictionary.
+
+    >>> v = Vector(3, 4)
+    >>> v.x = 5
+    Traceback (most recent call last):
+    AttributeError: Vector is immutable
+    """
+
+    __slots__ = ('x', 'y')
+
     def __init__(self, x, y):
-        self.x = x
-        self.y = y
+        _set_x(self, x)
+        _set_y(self, y)
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Vector is immutable")
+
+    def __delattr__(self, name):
+        raise AttributeError("Vector is immutable")
+
+    def __reduce__(self):
+        return Vector, (self.x, self.y)
 
     def size(self):
         """
@@ -53,14 +73,28 @@ class Vector:
         >>> Vector(10, 15).dist(Vector(14, 18))
         5.0
         """
-        return (self - other).size()
+        dx = self.x - other.x
+        dy = self.y - other.y
+        return math.sqrt(dx * dx + dy * dy)
+
+    def dist2(self, other):
+        """
+        The squared distance, which avoids the square root when only comparing distances.
+
+        >>> Vector(10, 15).dist2(Vector(14, 18))
+        25
+        """
+        dx = self.x - other.x
+        dy = self.y - other.y
+        return dx * dx + dy * dy
 
     def normalize(self):
         """
         >>> Vector(3, 4).normalize()
         (0.600, 0.800)
         """
-        return self * (1.0 / self.size())
+        f = 1.0 / self.size()
+        return Vector(self.x * f, self.y * f)
 
     def crossp(self, other):
         """
@@ -122,7 +156,9 @@ class Vector:
         >>> Vector(5, 8) == Vector(-5, -8)
         False
         """
-        return self.dist(other) < 0.000001
+        dx = self.x - other.x
+        dy = self.y - other.y
+        return dx * dx + dy * dy < 1e-12
 
     def __ne__(self, other):
         """
@@ -150,6 +186,11 @@ class Vector:
         return iter((self.x, self.y))
 
 
+# Vector.__setattr__ is disabled, so the slots are set through their descriptors
+_set_x = Vector.x.__set__
+_set_y = Vector.y.__set__
+
+
 def ccw(a, b, c):
     """
     1: c is left of the line a->b
@@ -163,7 +204,9 @@ def ccw(a, b, c):
     >>> ccw(Vector(0, 0), Vector(3, 4), Vector(6, 7))
     -1
     """
-    cp = (b - a).crossp(c - a)
+    ax = a.x
+    ay = a.y
+    cp = (b.x - ax) * (c.y - ay) - (b.y - ay) * (c.x - ax)
     if cp > 0.0:
         return 1
     elif cp < 0.0:
@@ -172,6 +215,8 @@ def ccw(a, b, c):
 
 
 class Line(object):
+    __slots__ = ('A', 'B', 'C')
+
     def __init__(self, A, B, C):
         """
         Constructs a line with the equation A*x + B*y + C = 0 
@@ -216,10 +261,19 @@ class Line(object):
         return Line(-B, A, D)
 
     def drop_perpendicular(self, point):
-        """  The point of intersection of a perpendicular line dropped from the specified point to this line. """
-        p = self.perpendicular(point)
-        i = self.intersection(p)    # point on the line
-        return i
+        """
+        The point of intersection of a perpendicular line dropped from the specified point to this line.
+
+        >>> LineSegment(Vector(0, 0), Vector(4, 4)).drop_perpendicular(Vector(0, 2))
+        (1.000, 1.000)
+        """
+        # The intersection with self.perpendicular(point), solved directly
+        A, B, C = self.A, self.B, self.C
+        det = A * A + B * B
+        if det == 0:
+            raise GeometryException()
+        D = A * point.y - B * point.x
+        return Vector((A * C - B * D) / det, (A * D + B * C) / det)
 
     def reflection(self, point):
         """ Reflection of a point over this line. """
@@ -228,9 +282,17 @@ class Line(object):
 
 
     def dist(self, point):
-        """ The (perpendicular) distance from this line to a point. """
-        i = self.drop_perpendicular(point)
-        return point.dist(i)
+        """
+        The (perpendicular) distance from this line to a point.
+
+        >>> LineSegment(Vector(0, 0), Vector(3, 4)).dist(Vector(4, -3))
+        5.0
+        """
+        A, B = self.A, self.B
+        det = A * A + B * B
+        if det == 0:
+            raise GeometryException()
+        return abs(A * point.x + B * point.y - self.C) / math.sqrt(det)
 
     def __str__(self):
         return "[%.3f*x+%.3f*y+%.3f=0]" % (self.A, self.B, self.C)
@@ -240,6 +302,8 @@ class Line(object):
 
 
 class LineSegment(Line):
+    __slots__ = ('a', 'b')
+
     def __init__(self, a, b):
         """
         Constructs a line segment from Vector a to Vector b.
@@ -251,10 +315,11 @@ class LineSegment(Line):
         """
         self.a = a
         self.b = b
-        A = self.b.y - self.a.y
-        B = self.a.x - self.b.x
-        C = A * self.a.x + B * self.a.y
-        super(LineSegment, self).__init__(A, B, C)
+        ax = a.x
+        ay = a.y
+        A = self.A = b.y - ay
+        B = self.B = ax - b.x
+        self.C = A * ax + B * ay
 
     def __iter__(self):
         """ Allows a, b = line """
@@ -301,7 +366,9 @@ class LineSegment(Line):
         return str(self)
 
 
-class Circle:
+class Circle(object):
+    __slots__ = ('c', 'r')
+
     def __init__(self, c, r):
         """ Constructs a circle with center Vector c and radius r. """
         self.c = c
@@ -398,7 +465,7 @@ class Circle:
     def intersects(self, line):
         """ Returns the average of the points of intersection, or None """
         p = line.drop_perpendicular(self.c)
-        if self.c.dist(p) <= self.r:
+        if self.c.dist2(p) <= self.r * self.r:
             return p
         else:
             return None
@@ -437,15 +504,20 @@ def circle(a, b, c):
     >>> circle(Vector(0, 3), Vector(3, 0), Vector(3, 6))
     {(3.000, 3.000) 3.0}
     """
-    line1 = LineSegment(a, b)
-    line2 = LineSegment(b, c)
-    p1 = line1.perpendicular_bisector()
-    p2 = line2.perpendicular_bisector()
-    c = p1.intersection(p2)
-    if c is None:
-        return None
-    r = c.dist(a)
-    return Circle(c, r)
+    # The intersection of the perpendicular bisectors, solved directly
+    ax, ay = a.x, a.y
+    bx = b.x - ax
+    by = b.y - ay
+    cx = c.x - ax
+    cy = c.y - ay
+    det = 2 * (bx * cy - by * cx)
+    if det == 0:
+        raise GeometryException()
+    b2 = bx * bx + by * by
+    c2 = cx * cx + cy * cy
+    ux = (cy * b2 - by * c2) / det
+    uy = (bx * c2 - cx * b2) / det
+    return Circle(Vector(ax + ux, ay + uy), math.sqrt(ux * ux + uy * uy))
 
 
 def heron(a, b, c):
@@ -527,4 +599,421 @@ def circle_intersects_further(circle, segment):
         return a.dist(segment.a) > segment.length() and a.dist(segment.a) > a.dist(segment.b)
     except GeometryException:
         return False    # No intersection
-        
\ No newline at end of file
+        
+
+def _monotone_chain(xs, ys):
+    """
+    Andrew's monotone chain on points sorted by (x, y). Returns the indices of the convex hull in counterclockwise
+    order, starting with the first point. Collinear points are left out.
+    """
+    n = len(xs)
+    if n < 3:
+        return list(range(n)) if n < 2 or (xs[0], ys[0]) != (xs[1], ys[1]) else [0]
+    hull = []
+    for start, stop, step in ((0, n, 1), (n - 1, -1, -1)):
+        base = len(hull) + 1
+        for i in range(start, stop, step):
+            x = xs[i]
+            y = ys[i]
+            while len(hull) > base:
+                b = hull[-1]
+                a = hull[-2]
+                ax = xs[a]
+                ay = ys[a]
+                if (xs[b] - ax) * (y - ay) - (ys[b] - ay) * (x - ax) > 0:
+                    break
+                hull.pop()
+            hull.append(i)
+        # The last point of each half is the first of the other
+        hull.pop()
+    if len(hull) == 2 and (xs[hull[0]], ys[hull[0]]) == (xs[hull[1]], ys[hull[1]]):
+        hull.pop()
+    return hull
+
+
+def _akl_toussaint(coords):
+    """
+    A mask of the points that may be on the convex hull: those that are not strictly inside the octagon of the
+    extreme points in the directions x, y, x + y and x - y.
+    """
+    import numpy
+
+    x = coords[:, 0]
+    y = coords[:, 1]
+    s = x + y
+    d = x - y
+    # Counterclockwise, starting at the bottom
+    extremes = [y.argmin(), d.argmax(), x.argmax(), s.argmax(), y.argmax(), d.argmin(), x.argmin(), s.argmin()]
+    polygon = []
+    for i in extremes:
+        if not polygon or (polygon[-1] != i and polygon[0] != i):
+            polygon.append(i)
+    keep = numpy.zeros(len(x), dtype=bool)
+    if len(polygon) < 3:
+        keep[:] = True
+        return keep
+    for a, b in zip(polygon, polygon[1:] + polygon[:1]):
+        ax = x[a]
+        ay = y[a]
+        keep |= (x[b] - ax) * (y - ay) - (y[b] - ay) * (x - ax) <= 0
+    return keep
+
+
+def convex_hull(points):
+    """
+    The convex hull of the points, in counterclockwise order starting at the lowest leftmost point, without
+    collinear points. Andrew's monotone chain, O(n log n).
+
+    points is a list of Vectors, in which case the result is a list of Vectors, or a NumPy array of shape (n, 2),
+    in which case the result is an array of shape (h, 2). With NumPy, the points strictly inside the octagon of
+    extreme points are removed with vectorised operations first (Akl-Toussaint), so that only a small fraction of
+    random inputs reaches the sort and the chain.
+
+    >>> convex_hull([Vector(0, 0), Vector(2, 0), Vector(1, 1), Vector(2, 2), Vector(0, 2), Vector(1, 0)])
+    [(0.000, 0.000), (2.000, 0.000), (2.000, 2.000), (0.000, 2.000)]
+    >>> import numpy
+    >>> convex_hull(numpy.array([[0, 0], [4, 0], [1, 1], [1, 2], [0, 4], [3, 1]])).tolist()
+    [[0, 0], [4, 0], [0, 4]]
+    """
+    if isinstance(points, (list, tuple)):
+        if len(points) > 1000:
+            try:
+                import numpy
+            except ImportError:
+                numpy = None
+            if numpy is not None:
+                from itertools import compress
+
+                coords = numpy.array([(p.x, p.y) for p in points], dtype=float)
+                points = list(compress(points, _akl_toussaint(coords).tolist()))
+        points = sorted(points, key=lambda p: (p.x, p.y))
+        xs = [p.x for p in points]
+        ys = [p.y for p in points]
+        return [points[i] for i in _monotone_chain(xs, ys)]
+
+    import numpy
+
+    coords = numpy.asarray(points)
+    if len(coords) > 16:
+        coords = coords[_akl_toussaint(coords)]
+    coords = coords[numpy.lexsort((coords[:, 1], coords[:, 0]))]
+    return coords[_monotone_chain(coords[:, 0].tolist(), coords[:, 1].tolist())]
+
+
+class _TreapNode(object):
+    __slots__ = ('key', 'priority', 'left', 'right')
+
+    def __init__(self, key, priority):
+        self.key = key
+        self.priority = priority
+        self.left = None
+        self.right = None
+
+
+def _treap_split(node, key):
+    """ Splits a treap without key into the treaps of the keys below and above key. """
+    if node is None:
+        return None, None
+    if node.key < key:
+        node.right, right = _treap_split(node.right, key)
+        return node, right
+    left, node.left = _treap_split(node.left, key)
+    return left, node
+
+
+def _treap_merge(a, b):
+    """ Joins two treaps, where every key in a is below every key in b. """
+    if a is None:
+        return b
+    if b is None:
+        return a
+    if a.priority > b.priority:
+        a.right = _treap_merge(a.right, b)
+        return a
+    b.left = _treap_merge(a, b.left)
+    return b
+
+
+def _treap_insert(node, new):
+    if node is None:
+        return new
+    if new.priority > node.priority:
+        new.left, new.right = _treap_split(node, new.key)
+        return new
+    if new.key < node.key:
+        node.left = _treap_insert(node.left, new)
+    else:
+        node.right = _treap_insert(node.right, new)
+    return node
+
+
+def _treap_delete(node, key):
+    if node.key == key:
+        return _treap_merge(node.left, node.right)
+    if key < node.key:
+        node.left = _treap_delete(node.left, key)
+    else:
+        node.right = _treap_delete(node.right, key)
+    return node
+
+
+class _HalfHull(object):
+    """
+    The lower hull of a set of points, as (x, y) tuples in a treap ordered by x and y, so that finding the
+    neighbours of a point, inserting it and deleting a point all take O(log h) expected time.
+    """
+
+    def __init__(self):
+        from random import random
+
+        self.root = None
+        self.size = 0
+        self.random = random
+
+    def neighbours(self, p):
+        """ (below, above, found): the keys next to p, or None, and whether p itself is a key. """
+        below = above = None
+        node = self.root
+        while node is not None:
+            key = node.key
+            if p < key:
+                above = key
+                node = node.left
+            elif key < p:
+                below = key
+                node = node.right
+            else:
+                if node.left is not None:
+                    node_below = node.left
+                    while node_below.right is not None:
+                        node_below = node_below.right
+                    below = node_below.key
+                if node.right is not None:
+                    node_above = node.right
+                    while node_above.left is not None:
+                        node_above = node_above.left
+                    above = node_above.key
+                return below, above, True
+        return below, above, False
+
+    def first(self):
+        node = self.root
+        while node.left is not None:
+            node = node.left
+        return node.key
+
+    def last(self, k=1):
+        """ The last k keys, in order. """
+        keys = []
+        stack = []
+        node = self.root
+        while len(keys) < k and (stack or node is not None):
+            if node is not None:
+                stack.append(node)
+                node = node.right
+            else:
+                node = stack.pop()
+                keys.append(node.key)
+                node = node.left
+        keys.reverse()
+        return keys
+
+    def __iter__(self):
+        stack = []
+        node = self.root
+        while stack or node is not None:
+            if node is not None:
+                stack.append(node)
+                node = node.left
+            else:
+                node = stack.pop()
+                yield node.key
+                node = node.right
+
+    def remove(self, key):
+        self.root = _treap_delete(self.root, key)
+        self.size -= 1
+
+    def add(self, p):
+        """
+        Adds a point, and returns whether it is on the lower hull. Each point is removed at most once, so the points
+        that p pushes inside the hull add O(log h) amortised time.
+        """
+        a, b, found = self.neighbours(p)
+        if found:
+            return False
+        px, py = p
+        if a is not None and b is not None:
+            (ax, ay), (bx, by) = a, b
+            if (bx - ax) * (py - ay) - (by - ay) * (px - ax) >= 0:
+                # On or above the hull
+                return False
+        self.root = _treap_insert(self.root, _TreapNode(p, self.random()))
+        self.size += 1
+        # Remove the neighbours that are no longer convex
+        while b is not None:
+            c = self.neighbours(b)[1]
+            if c is None:
+                break
+            (bx, by), (cx, cy) = b, c
+            if (bx - px) * (cy - py) - (by - py) * (cx - px) > 0:
+                break
+            self.remove(b)
+            b = c
+        while a is not None:
+            c = self.neighbours(a)[0]
+            if c is None:
+                break
+            (ax, ay), (cx, cy) = a, c
+            if (ax - cx) * (py - cy) - (ay - cy) * (px - cx) > 0:
+                break
+            self.remove(a)
+            a = c
+        return True
+
+
+class OnlineHull(object):
+    """
+    The convex hull of a stream of points. Only the current hull vertices are stored, in two treaps. An insertion
+    finds its place in O(log h) expected time, where h is the size of the hull, and each point that it pushes inside
+    the hull is deleted in O(log h). A point is deleted at most once, so an insertion takes O(log h) amortised.
+
+    The hull is kept as a lower and an upper half, the upper half being the lower hull of the points mirrored in
+    the x axis.
+
+    >>> hull = OnlineHull()
+    >>> [hull.add(p) for p in [Vector(0, 0), Vector(2, 0), Vector(1, 3), Vector(1, 1)]]
+    [True, True, True, False]
+    >>> hull.hull(), len(hull)
+    ([(0.000, 0.000), (2.000, 0.000), (1.000, 3.000)], 3)
+    >>> hull.add(Vector(3, 3)), hull.hull()
+    (True, [(0.000, 0.000), (2.000, 0.000), (3.000, 3.000), (1.000, 3.000)])
+    """
+
+    def __init__(self, points=()):
+        self.lower = _HalfHull()
+        self.upper = _HalfHull()
+        for point in points:
+            self.add(point)
+
+    def add(self, point):
+        """ Adds a point, and returns True if it is a vertex of the new hull. """
+        x = point.x
+        y = point.y
+        lower = self.lower.add((x, y))
+        upper = self.upper.add((x, -y))
+        return lower or upper
+
+    def _right_edge(self):
+        """ The number of points at the end of the upper half that the lower half also ends with. """
+        # The lower half ends with the whole right vertical edge, if there is one, which the mirrored upper half
+        # also contains in reverse
+        right = self.lower.last()[0][0]
+        return sum(1 for x, y in self.upper.last(2) if x == right)
+
+    def hull(self):
+        """ The vertices of the hull as Vectors, in the same order as convex_hull(). """
+        if not self.lower.size:
+            return []
+        lower = list(self.lower)
+        points = [Vector(x, y) for x, y in lower]
+        upper = list(self.upper)
+        del upper[len(upper) - self._right_edge():]
+        points.extend(Vector(x, -y) for x, y in reversed(upper))
+        if len(points) > 1 and lower[0] == (points[-1].x, points[-1].y):
+            points.pop()
+        return points
+
+    def __len__(self):
+        if not self.lower.size:
+            return 0
+        n = self.lower.size + self.upper.size - self._right_edge()
+        if n > self.lower.size:
+            x, y = self.upper.first()
+            if (x, -y) == self.lower.first():
+                n -= 1
+        return n
+
+
+def _hull_coordinates(hull):
+    if hasattr(hull, 'shape'):
+        return hull[:, 0].tolist(), hull[:, 1].tolist()
+    return [p.x for p in hull], [p.y for p in hull]
+
+
+def diameter(hull):
+    """
+    The largest distance between two points of a convex hull, given in counterclockwise order as returned by
+    convex_hull(), by rotating calipers in O(h). The diameter of a point set is that of its convex hull.
+
+    Returns (distance, a, b), where a and b are the farthest pair. Raises ValueError for an empty hull.
+
+    >>> diameter(convex_hull([Vector(0, 0), Vector(4, 0), Vector(4, 3), Vector(1, 1), Vector(0, 3)]))
+    (5.0, (0.000, 0.000), (4.000, 3.000))
+    >>> diameter([])
+    Traceback (most recent call last):
+        ...
+    ValueError: diameter needs at least one point
+    """
+    if not len(hull):
+        raise ValueError("diameter needs at least one point")
+    xs, ys = _hull_coordinates(hull)
+    n = len(xs)
+    if n < 2:
+        return 0.0, hull[0], hull[0]
+    best = -1
+    pair = None
+    j = 1
+    for i in range(n):
+        k = i + 1 if i + 1 < n else 0
+        ax = xs[i]
+        ay = ys[i]
+        ex = xs[k] - ax
+        ey = ys[k] - ay
+        # Advance j while it moves away from the edge i -> k
+        while True:
+            l = j + 1 if j + 1 < n else 0
+            if ex * (ys[l] - ys[j]) - ey * (xs[l] - xs[j]) <= 0:
+                break
+            j = l
+        for a in (i, k):
+            dx = xs[a] - xs[j]
+            dy = ys[a] - ys[j]
+            d = dx * dx + dy * dy
+            if d > best:
+                best = d
+                pair = (a, j)
+    return math.sqrt(best), hull[pair[0]], hull[pair[1]]
+
+
+def width(hull):
+    """
+    The smallest distance between two parallel lines enclosing a convex hull, given in counterclockwise order as
+    returned by convex_hull(), by rotating calipers in O(h). Raises ValueError for an empty hull.
+
+    >>> width(convex_hull([Vector(0, 0), Vector(4, 0), Vector(4, 3), Vector(1, 1), Vector(0, 3)]))
+    3.0
+    """
+    if not len(hull):
+        raise ValueError("width needs at least one point")
+    xs, ys = _hull_coordinates(hull)
+    n = len(xs)
+    if n < 3:
+        return 0.0
+    best = float('inf')
+    j = 1
+    for i in range(n):
+        k = i + 1 if i + 1 < n else 0
+        ax = xs[i]
+        ay = ys[i]
+        ex = xs[k] - ax
+        ey = ys[k] - ay
+        while True:
+            l = j + 1 if j + 1 < n else 0
+            if ex * (ys[l] - ys[j]) - ey * (xs[l] - xs[j]) <= 0:
+                break
+            j = l
+        height = (ex * (ys[j] - ay) - ey * (xs[j] - ax)) / math.sqrt(ex * ex + ey * ey)
+        if height < best:
+            best = height
+    return best
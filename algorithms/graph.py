@@ -109,6 +109,10 @@ class GridGraph(Graph):
     def nodes(self):
         return filter(self.node_filter, self.all_nodes())
 
+    def flat(self, diagonal=False):
+        """ This grid as a FlatGrid, for fast searches. """
+        return FlatGrid.from_grid(self.grid, self.filter, diagonal)
+
     def __str__(self):
         result = ""
         for row in self.grid:
@@ -119,6 +123,222 @@ class GridGraph(Graph):
         return str(self)
 
 
+class FlatGrid(Graph):
+    """
+    A grid for fast searches, with cells identified by integer indices instead of (row, col) tuples.
+
+    The grid is stored row by row with a border of blocked cells around it, so that the neighbours of cell i are
+    simply i + offset for a fixed list of offsets, without bounds checks. `passable` is a bytearray mask over all
+    cells including the border. With diagonal=True, cells have 8 neighbours instead of 4.
+
+    `costs` optionally gives the cost of entering each cell, as non-negative integers indexed like `passable`.
+    By default every step costs 1.
+
+    The bfs, dijkstra and floodfill methods work on flat arrays indexed by cell. Use position() and index() to convert
+    between cells and (row, col), and path() and to_grid() to convert results.
+
+    >>> g = FlatGrid.from_grid([[1, 1, 1], [0, 0, 1], [1, 1, 1]])
+    >>> start, end = g.index(0, 0), g.index(2, 0)
+    >>> dist, pred = g.bfs(start)
+    >>> dist[end]
+    6
+    >>> g.path(pred, end)
+    [(0, 0), (0, 1), (0, 2), (1, 2), (2, 2), (2, 1), (2, 0)]
+    >>> g.to_grid(dist)
+    [[0, 1, 2], [-1, -1, 3], [6, 5, 4]]
+    >>> sorted(g.position(n) for n in g.edges(g.index(1, 2)))
+    [(0, 2), (2, 2)]
+    """
+
+    def __init__(self, rows, cols, passable, diagonal=False, costs=None):
+        self.rows = rows
+        self.cols = cols
+        self.width = cols + 2
+        self.passable = passable
+        self.costs = costs
+        self._weight_range = None
+        w = self.width
+        self.offsets = (-w, -1, 1, w)
+        if diagonal:
+            self.offsets += (-w - 1, -w + 1, w - 1, w + 1)
+
+    @classmethod
+    def from_grid(cls, grid, filter=None, diagonal=False, costs=None):
+        """
+        Builds the grid from a list of rows, using the same `filter` convention as GridGraph: any truthy result
+        makes a cell passable.
+
+        `costs` may be given as a function of the cell value.
+
+        >>> g = GridGraph([[2, 0, 3], [0, 0, 0], [3, 0, 'x']], filter=lambda v: v)
+        >>> g.flat().floodfill()[0], floodfill(g)[0]
+        (4, 4)
+        """
+        from array import array
+
+        if not filter:
+            filter = bool
+        rows = len(grid)
+        cols = len(grid[0])
+        padding = bytes(cols + 2)
+        passable = bytearray(padding)
+        for row in grid:
+            passable.append(0)
+            passable.extend(map(bool, map(filter, row)))
+            passable.append(0)
+        passable.extend(padding)
+        cell_costs = None
+        if costs is not None:
+            cell_costs = array('q', bytes(8 * (cols + 2)))
+            for row in grid:
+                cell_costs.append(0)
+                cell_costs.extend(map(costs, row))
+                cell_costs.append(0)
+            cell_costs.extend(array('q', bytes(8 * (cols + 2))))
+        return cls(rows, cols, passable, diagonal, cell_costs)
+
+    def index(self, row, col):
+        return (row + 1) * self.width + col + 1
+
+    def position(self, index):
+        row, col = divmod(index, self.width)
+        return row - 1, col - 1
+
+    def path(self, predecessors, end):
+        """ The path to end as a list of (row, col), following a predecessor array from bfs or dijkstra. """
+        path = []
+        while end >= 0:
+            path.append(self.position(end))
+            end = predecessors[end]
+        path.reverse()
+        return path
+
+    def to_grid(self, values):
+        """ Converts an array indexed by cell to a list of rows, without the border. """
+        w = self.width
+        return [list(values[(row + 1) * w + 1:(row + 2) * w - 1]) for row in range(self.rows)]
+
+    def edges(self, node, **kwargs):
+        passable = self.passable
+        if not passable[node]:
+            return {}
+        costs = self.costs
+        return {n: costs[n] if costs else 1 for n in (node + o for o in self.offsets) if passable[n]}
+
+    def nodes(self):
+        from itertools import compress
+        return compress(range(len(self.passable)), self.passable)
+
+    def bfs(self, start, end=None):
+        """
+        Breadth first search from start, ignoring costs, until end is reached.
+
+        Returns the arrays (distances, predecessors), indexed by cell. Unreached cells have distance and
+        predecessor -1.
+        """
+        from array import array
+
+        size = len(self.passable)
+        dist = array('i', [-1]) * size
+        pred = array('i', [-1]) * size
+        unvisited = bytearray(self.passable)
+        offsets = self.offsets
+        dist[start] = 0
+        unvisited[start] = 0
+        frontier = [start]
+        d = 0
+        while frontier:
+            if end is not None and dist[end] >= 0:
+                break
+            d += 1
+            next_frontier = []
+            for node in frontier:
+                for o in offsets:
+                    n = node + o
+                    if unvisited[n]:
+                        unvisited[n] = 0
+                        dist[n] = d
+                        pred[n] = node
+                        next_frontier.append(n)
+            frontier = next_frontier
+        return dist, pred
+
+    def dijkstra(self, start, end=None):
+        """
+        Dijkstra's algorithm from start using the cell costs, until end is settled.
+
+        Returns the arrays (distances, predecessors), indexed by cell. Unreached cells have distance and
+        predecessor -1.
+
+        Queue entries are packed into single integers (distance * size + cell), so the heap holds no tuples.
+        """
+        if self.costs is None:
+            return self.bfs(start, end)
+
+        import heapq
+        from array import array
+
+        size = len(self.passable)
+        dist = array('q', [-1]) * size
+        pred = array('i', [-1]) * size
+        done = bytearray(size)
+        passable = self.passable
+        costs = self.costs
+        offsets = self.offsets
+        dist[start] = 0
+        queue = [start]
+        while queue:
+            distance, node = divmod(heapq.heappop(queue), size)
+            if done[node]:
+                continue
+            done[node] = 1
+            if node == end:
+                break
+            for o in offsets:
+                n = node + o
+                if not passable[n] or done[n]:
+                    continue
+                total = distance + costs[n]
+                if dist[n] < 0 or total < dist[n]:
+                    dist[n] = total
+                    pred[n] = node
+                    heapq.heappush(queue, total * size + n)
+        return dist, pred
+
+    def floodfill(self):
+        """
+        Labels connected cells, like floodfill().
+
+        Returns (n, labels), where labels is an array indexed by cell, with group numbers starting at 1 and 0 for
+        blocked cells.
+        """
+        from array import array
+
+        labels = array('i', bytes(4 * len(self.passable)))
+        unvisited = bytearray(self.passable)
+        offsets = self.offsets
+        i = 0
+        node = unvisited.find(1)
+        while node >= 0:
+            i += 1
+            unvisited[node] = 0
+            labels[node] = i
+            queue = [node]
+            while queue:
+                next = queue.pop()
+                for o in offsets:
+                    n = next + o
+                    if unvisited[n]:
+                        unvisited[n] = 0
+                        labels[n] = i
+                        queue.append(n)
+            node = unvisited.find(1, node)
+        return i, labels
+
+    def __repr__(self):
+        return "<FlatGrid %dx%d>" % (self.rows, self.cols)
+
+
 class DirectedGraph(Graph):
     def __init__(self, G=None):
         """
@@ -199,6 +419,372 @@ class UndirectedGraph(DirectedGraph):
         return "<Undirected %s>" % self
 
 
+class CSRGraph(Graph):
+    """
+    A directed graph in compressed sparse row form.
+
+    Nodes are the integers 0..n-1. The edges of node i are targets[offsets[i]:offsets[i+1]], with matching weights.
+    All three are flat arrays, which takes about 12-16 bytes per edge instead of a dict entry per edge.
+
+    `labels` optionally maps node ids to arbitrary node objects, for graphs converted from another representation.
+
+    dijkstra, shortest_path and floodfill work directly on the arrays for this class.
+
+    >>> g = CSRGraph.from_edges(3, [0, 1, 0], [1, 2, 2], [5, 1, 7])
+    >>> list(g.nodes())
+    [0, 1, 2]
+    >>> sorted(g.edges(0).items())
+    [(1, 5), (2, 7)]
+    >>> g.total_edges()
+    3
+    >>> shortest_path(g, 0, 2)
+    [0, 1, 2]
+    >>> g = CSRGraph.from_graph(DirectedGraph({'a': {'b': 2}, 'b': {'c': 3}}))
+    >>> g.node_id('b'), g.label(2)
+    (1, 'c')
+    >>> sorted(g.edges(g.node_id('a')).items())
+    [(1, 2)]
+    """
+
+    def __init__(self, offsets, targets, weights, labels=None):
+        self.offsets = offsets
+        self.targets = targets
+        self.weights = weights
+        self.n = len(offsets) - 1
+        self.labels = labels
+        self._ids = None
+        self._reverse = None
+        self._weight_range = None
+
+    @classmethod
+    def from_edges(cls, n, sources, targets, weights=None, labels=None):
+        """
+        Builds the graph from parallel sequences of edge sources, targets and weights. The default weight is 1.
+        """
+        from array import array
+        from collections import Counter
+        from itertools import accumulate
+
+        m = len(sources)
+        counts = Counter(sources)
+        offsets = array('q', [0])
+        offsets.extend(accumulate(counts.get(i, 0) for i in range(n)))
+        # A stable sort by source groups the edges, and keeps the input order within a source
+        order = sorted(range(m), key=sources.__getitem__)
+        flat_targets = array(_index_typecode(n), map(targets.__getitem__, order))
+        if weights is None:
+            flat_weights = array('q', [1]) * m
+        else:
+            flat_weights = array(_weight_typecode(weights), map(weights.__getitem__, order))
+        return cls(offsets, flat_targets, flat_weights, labels)
+
+    @classmethod
+    def from_graph(cls, graph):
+        """
+        Converts any Graph, such as a DirectedGraph. Node ids are assigned in the order of graph.nodes().
+        """
+        from array import array
+
+        labels = list(graph.nodes())
+        ids = {label: i for i, label in enumerate(labels)}
+        offsets = array('q', [0])
+        targets = array(_index_typecode(len(labels)))
+        weights = []
+        for label in labels:
+            edges = graph.edges(label)
+            targets.extend(map(ids.__getitem__, edges.keys()))
+            weights.extend(edges.values())
+            offsets.append(len(targets))
+        result = cls(offsets, targets, array(_weight_typecode(weights), weights), labels)
+        result._ids = ids
+        return result
+
+    def node_id(self, label):
+        """ The node id of a label. """
+        if self.labels is None:
+            return label
+        if self._ids is None:
+            self._ids = {label: i for i, label in enumerate(self.labels)}
+        return self._ids[label]
+
+    def label(self, node):
+        """ The label of a node id. """
+        if self.labels is None:
+            return node
+        return self.labels[node]
+
+    def edges(self, node, **kwargs):
+        if not 0 <= node < self.n:
+            return {}
+        a = self.offsets[node]
+        b = self.offsets[node + 1]
+        return dict(zip(self.targets[a:b], self.weights[a:b]))
+
+    def nodes(self):
+        return range(self.n)
+
+    def value(self, node):
+        return self.label(node)
+
+    def total_edges(self):
+        return len(self.targets)
+
+    def __repr__(self):
+        return "<CSR %d nodes, %d edges>" % (self.n, len(self.targets))
+
+
+def _index_typecode(n):
+    return 'i' if n < 2 ** 31 else 'q'
+
+
+def _weight_typecode(weights):
+    if hasattr(weights, 'typecode'):
+        return weights.typecode
+    if all(isinstance(w, int) for w in weights):
+        return 'q'
+    return 'd'
+
+
+# Loading graphs
+
+
+def _read_edge_data(source):
+    import sys
+
+    if source is None or source == '-':
+        return sys.stdin.buffer.read()
+    if isinstance(source, bytes):
+        return source
+    if isinstance(source, (bytearray, memoryview)):
+        return bytes(source)
+    if hasattr(source, 'read'):
+        data = source.read()
+        if isinstance(data, str):
+            data = data.encode()
+        return data
+    if hasattr(source, '__getitem__') and not isinstance(source, str):
+        # An mmap
+        return source[:]
+    with open(source, 'rb') as f:
+        return f.read()
+
+
+# Matches the start of a line of an edge list that is not blank and does not start with two integers of at most 15
+# digits, which a float64 holds exactly
+_NON_INTEGER_NODES = br'(?m)^(?![ \t]*(?:[-+]?\d{1,15}[ \t]+[-+]?\d{1,15}(?:[ \t]+\S+)?)?[ \t\r]*$)'
+
+
+def _parse_edges_numpy(data, columns):
+    """ Parses the whole edge list in C with NumPy. Returns None if NumPy is missing or cannot parse the data. """
+    try:
+        import numpy
+    except ImportError:
+        return None
+
+    import re
+    import warnings
+
+    for dtype in (numpy.int64, numpy.float64):
+        if dtype is numpy.float64:
+            # Only float weights are parsed as floats: every node token must still be an integer
+            if columns != 3 or re.search(_NON_INTEGER_NODES, data):
+                return None
+        try:
+            # NumPy 1.x only warns about tokens it cannot parse, and returns the values before them
+            with warnings.catch_warnings():
+                warnings.simplefilter('error', DeprecationWarning)
+                values = numpy.fromstring(data, dtype=dtype, sep=' ')
+        except (ValueError, DeprecationWarning):
+            continue
+        if len(values) % columns:
+            return None
+        if dtype is numpy.int64 and len(values):
+            # Integers that do not fit are saturated instead of failing
+            limits = numpy.iinfo(numpy.int64)
+            if values.max() == limits.max or values.min() == limits.min:
+                return None
+        values = values.reshape(-1, columns)
+        sources = values[:, 0]
+        targets = values[:, 1]
+        if dtype is numpy.float64:
+            sources = sources.astype(numpy.int64)
+            targets = targets.astype(numpy.int64)
+        weights = values[:, 2] if columns == 3 else None
+        return sources, targets, weights
+    return None
+
+
+def _parse_edges(data, columns):
+    tokens = data.split()
+    if len(tokens) % columns:
+        raise ValueError("every line of the edge list must have %d columns" % columns)
+    sources = tokens[0::columns]
+    targets = tokens[1::columns]
+    # The nodes of both columns are integers, or all of them are strings
+    try:
+        sources = list(map(int, sources))
+        targets = list(map(int, targets))
+    except ValueError:
+        sources = [token.decode() for token in tokens[0::columns]]
+        targets = [token.decode() for token in tokens[1::columns]]
+    weights = None
+    if columns == 3:
+        weights = tokens[2::3]
+        try:
+            weights = list(map(int, weights))
+        except ValueError:
+            weights = list(map(float, weights))
+    return sources, targets, weights
+
+
+def _load_dict_numpy(sources, targets, weights):
+    """
+    Builds the adjacency dictionaries from NumPy arrays. A stable argsort groups the edges by source, so that each
+    dictionary is built by a single dict() call, in the order add_edge() would have created it.
+    """
+    import numpy
+
+    nodes, first = numpy.unique(numpy.column_stack((sources, targets)).ravel(), return_index=True)
+    G = {node: {} for node in nodes[numpy.argsort(first, kind='stable')].tolist()}
+    order = numpy.argsort(sources, kind='stable')
+    grouped = sources[order]
+    starts = numpy.flatnonzero(numpy.diff(grouped, prepend=grouped[:1] - 1)).tolist()
+    ends = starts[1:] + [len(grouped)]
+    targets = targets[order].tolist()
+    if weights is None:
+        for node, a, b in zip(grouped[starts].tolist(), starts, ends):
+            G[node] = dict.fromkeys(targets[a:b], 1)
+    else:
+        weights = weights[order].tolist()
+        for node, a, b in zip(grouped[starts].tolist(), starts, ends):
+            G[node] = dict(zip(targets[a:b], weights[a:b]))
+    return G
+
+
+def _load_csr_numpy(sources, targets, weights):
+    """ Builds a CSRGraph from NumPy arrays of non-negative node ids, sorting the edges with a stable argsort. """
+    import numpy
+    from array import array
+
+    n = int(max(sources.max(), targets.max())) + 1 if len(sources) else 0
+    order = numpy.argsort(sources, kind='stable')
+    offsets = numpy.zeros(n + 1, dtype=numpy.int64)
+    numpy.cumsum(numpy.bincount(sources, minlength=n), out=offsets[1:])
+    typecode = _index_typecode(n)
+    flat_targets = array(typecode)
+    flat_targets.frombytes(targets[order].astype(numpy.int32 if typecode == 'i' else numpy.int64).tobytes())
+    if weights is None:
+        flat_weights = array('q', [1]) * len(order)
+    else:
+        flat_weights = array('q' if weights.dtype.kind == 'i' else 'd')
+        flat_weights.frombytes(weights[order].tobytes())
+    flat_offsets = array('q')
+    flat_offsets.frombytes(offsets.tobytes())
+    return CSRGraph(flat_offsets, flat_targets, flat_weights)
+
+
+def load_edges(source=None, directed=True, csr=False):
+    """
+    Loads a graph from an edge list, with one edge "a b" or "a b weight" per line, separated by whitespace. Lines
+    starting with # are comments. The default weight is 1.
+
+    source may be a file name, a binary or text file object, an mmap, bytes, or None or '-' for standard input. The
+    whole list is split in one go, by NumPy in C when it is available, and the adjacency dictionaries are filled in
+    a single pass without add_edge().
+
+    Nodes are integers if all of them parse as integers, otherwise strings.
+
+    The result is a DirectedGraph, or an UndirectedGraph if directed is False. With csr=True it is a CSRGraph
+    instead. Integer nodes 0..max are then used as node ids directly, and other nodes are labels in order of first
+    appearance.
+
+    >>> g = load_edges(b"# a comment\\n1 2 5\\n2 3 1\\n1 3 7\\n")
+    >>> g
+    <Directed {1: {2: 5, 3: 7}, 2: {3: 1}, 3: {}}>
+    >>> shortest_path(g, 1, 3)
+    [1, 2, 3]
+    >>> load_edges(b"1 2\\n2 3.5\\n")
+    <Directed {'1': {'2': 1}, '2': {'3.5': 1}, '3.5': {}}>
+    >>> load_edges(b"1 2 0.5\\n2 3.0 1\\n")
+    <Directed {'1': {'2': 0.5}, '2': {'3.0': 1.0}, '3.0': {}}>
+    >>> load_edges(b"9007199254740993 1 2.5\\n")
+    <Directed {9007199254740993: {1: 2.5}, 1: {}}>
+    >>> load_edges(b"99999999999999999999 1\\n1 2\\n")
+    <Directed {99999999999999999999: {1: 1}, 1: {2: 1}, 2: {}}>
+    >>> load_edges(b"a b\\nb c\\n", directed=False)
+    <Undirected {'a': {'b': 1}, 'b': {'a': 1, 'c': 1}, 'c': {'b': 1}}>
+    >>> g = load_edges(b"0 1 2.5\\n2 0 1.0\\n", csr=True)
+    >>> g, sorted(g.edges(2).items())
+    (<CSR 3 nodes, 2 edges>, [(0, 1.0)])
+    """
+    from itertools import chain, repeat
+
+    data = _read_edge_data(source)
+    if data[:1] == b'#' or b'\n#' in data:
+        data = b'\n'.join(line for line in data.split(b'\n') if not line.startswith(b'#'))
+    data = data.lstrip()
+    columns = len(data.split(b'\n', 1)[0].split())
+    if data and columns not in (2, 3):
+        raise ValueError("expected 2 or 3 columns in the edge list, found %d" % columns)
+    if not data:
+        columns = 2
+
+    graph = DirectedGraph() if directed else UndirectedGraph()
+    parsed = _parse_edges_numpy(data, columns) if data else None
+    if parsed is not None:
+        import numpy
+
+        sources, targets, weights = parsed
+        if not directed:
+            # Each edge followed by its reverse, as add_edge() would insert them
+            sources, targets = (numpy.column_stack((sources, targets)).ravel(),
+                                numpy.column_stack((targets, sources)).ravel())
+            if weights is not None:
+                weights = numpy.repeat(weights, 2)
+            directed = True
+        if csr and min(sources.min(), targets.min()) >= 0:
+            return _load_csr_numpy(sources, targets, weights)
+        if not csr:
+            graph.G = _load_dict_numpy(sources, targets, weights)
+            return graph
+        sources = sources.tolist()
+        targets = targets.tolist()
+        if weights is not None:
+            weights = weights.tolist()
+    else:
+        sources, targets, weights = _parse_edges(data, columns)
+
+    if csr:
+        labels = None
+        if all(isinstance(node, int) and node >= 0 for node in chain(sources, targets)):
+            n = max(chain(sources, targets), default=-1) + 1
+        else:
+            labels = list(dict.fromkeys(chain.from_iterable(zip(sources, targets))))
+            ids = {label: i for i, label in enumerate(labels)}
+            n = len(labels)
+            sources = list(map(ids.__getitem__, sources))
+            targets = list(map(ids.__getitem__, targets))
+        if not directed:
+            sources, targets = (list(chain.from_iterable(zip(sources, targets))),
+                                list(chain.from_iterable(zip(targets, sources))))
+            if weights is not None:
+                weights = list(chain.from_iterable(zip(weights, weights)))
+        return CSRGraph.from_edges(n, sources, targets, weights, labels)
+
+    G = {node: {} for node in dict.fromkeys(chain.from_iterable(zip(sources, targets)))}
+    if weights is None:
+        weights = repeat(1)
+    if directed:
+        for a, b, weight in zip(sources, targets, weights):
+            G[a][b] = weight
+    else:
+        for a, b, weight in zip(sources, targets, weights):
+            G[a][b] = weight
+            G[b][a] = weight
+    graph.G = G
+    return graph
+
+
 def floodfill(graph):
     """
     Given a graph, performs a flood fill. The result is undefined on directed graphs.
@@ -215,6 +801,9 @@ def floodfill(graph):
     [((0, 0), 1), ((0, 1), 1), ((2, 0), 2), ((2, 1), 2)]
     """
 
+    if isinstance(graph, CSRGraph):
+        return _floodfill_csr(graph)
+
     result = {}
     i = 0
     for node in graph.nodes():
@@ -232,10 +821,267 @@ def floodfill(graph):
     return i, result
 
 
+def _floodfill_csr(graph):
+    offsets = graph.offsets
+    targets = graph.targets
+    group = [0] * graph.n
+    i = 0
+    for node in range(graph.n):
+        if group[node]:
+            continue
+        i += 1
+        queue = [node]
+        group[node] = i
+        while queue:
+            next = queue.pop()
+            for neighbour in targets[offsets[next]:offsets[next + 1]]:
+                if not group[neighbour]:
+                    queue.append(neighbour)
+                    group[neighbour] = i
+    return i, dict(enumerate(group))
+
+
+def _tiled_label_band(mask_name, labels_name, cols, start, end):
+    """
+    Labels the connected cells of rows start..end-1 with local group numbers 1..k, written to the shared labels
+    array. Returns k.
+    """
+    from multiprocessing import shared_memory
+
+    mask_memory = shared_memory.SharedMemory(name=mask_name)
+    labels_memory = shared_memory.SharedMemory(name=labels_name)
+    try:
+        mask = mask_memory.buf
+        rows = end - start
+        padding = bytes(cols + 2)
+        passable = bytearray(padding)
+        for row in range(start, end):
+            passable.append(0)
+            passable += mask[row * cols:(row + 1) * cols]
+            passable.append(0)
+        passable += padding
+        del mask
+        n, band = FlatGrid(rows, cols, passable).floodfill()
+        w = cols + 2
+        # The cast view must be released before close(), also when this fails
+        with labels_memory.buf.cast('i') as labels:
+            for row in range(rows):
+                labels[(start + row) * cols:(start + row + 1) * cols] = band[(row + 1) * w + 1:(row + 2) * w - 1]
+        return n
+    finally:
+        mask_memory.close()
+        labels_memory.close()
+
+
+def _tiled_relabel_band(labels_name, cols, start, end, table):
+    """ Replaces the local group numbers of rows start..end-1 in the shared labels array by table[number]. """
+    from array import array
+    from multiprocessing import shared_memory
+
+    labels_memory = shared_memory.SharedMemory(name=labels_name)
+    try:
+        with labels_memory.buf.cast('i') as labels, labels[start * cols:end * cols] as band:
+            band[:] = array('i', map(table.__getitem__, band))
+    finally:
+        labels_memory.close()
+
+
+def tiled_floodfill(graph, bands=None, processes=None):
+    """
+    Performs a flood fill of a GridGraph in parallel, for very large grids.
+
+    The grid is split into `bands` bands of rows (default: one per process). Each band is labelled by a separate
+    worker process, reading the grid and writing the labels in shared memory. The labels are then merged along the
+    band boundaries with a DisjointSet, and renumbered by the workers. With processes=1, everything runs in this
+    process.
+
+    Group numbers (i) start at 1, in the same order as floodfill().
+
+    Result: (n, labels), where labels is an array('i') of rows * cols group numbers in row-major order, with 0 for
+    blocked cells.
+
+    >>> g = GridGraph([[1, 0, 1], [1, 0, 1], [1, 1, 0], [0, 0, 1]])
+    >>> n, labels = tiled_floodfill(g, bands=3, processes=1)
+    >>> n
+    3
+    >>> [list(labels[r * 3:(r + 1) * 3]) for r in range(4)]
+    [[1, 0, 2], [1, 0, 2], [1, 1, 0], [0, 0, 3]]
+    """
+    import os
+    from array import array
+    from multiprocessing import shared_memory
+
+    rows = graph.rows
+    cols = graph.cols
+    if processes is None:
+        processes = os.cpu_count() or 1
+    if bands is None:
+        bands = processes
+    bands = max(1, min(bands, rows))
+    bounds = [rows * b // bands for b in range(bands + 1)]
+    tiles = list(zip(bounds, bounds[1:]))
+
+    mask_memory = shared_memory.SharedMemory(create=True, size=max(1, rows * cols))
+    labels_memory = shared_memory.SharedMemory(create=True, size=max(4, 4 * rows * cols))
+    pool = None
+    try:
+        node_filter = graph.filter
+        for row in range(rows):
+            mask_memory.buf[row * cols:(row + 1) * cols] = bytes(map(bool, map(node_filter, graph.grid[row])))
+
+        if processes == 1:
+            run = lambda function, calls: [function(*call) for call in calls]
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+
+            pool = ProcessPoolExecutor(processes)
+            run = lambda function, calls: list(pool.map(function, *zip(*calls)))
+
+        counts = run(_tiled_label_band, [(mask_memory.name, labels_memory.name, cols, start, end)
+                                         for start, end in tiles])
+        # Group g of band b gets the global id offsets[b] + g
+        offsets = [0]
+        for count in counts:
+            offsets.append(offsets[-1] + count)
+
+        # Merge across the boundaries. The smaller id always becomes the root, so that each merged group is
+        # numbered by its first cell.
+        sets = DisjointSet(offsets[-1] + 1)
+        parent = sets.parent
+        find = sets.find
+        # Every view of the shared memory must be released before close(), also when a step fails
+        with labels_memory.buf.cast('i') as labels:
+            for b in range(1, len(tiles)):
+                row = tiles[b][0]
+                with labels[(row - 1) * cols:row * cols] as above, labels[row * cols:(row + 1) * cols] as below:
+                    for x, y in zip(above, below):
+                        if x and y:
+                            x = find(offsets[b - 1] + x)
+                            y = find(offsets[b] + y)
+                            if x < y:
+                                parent[y] = x
+                            elif y < x:
+                                parent[x] = y
+
+            final = array('i', bytes(4 * (offsets[-1] + 1)))
+            n = 0
+            for g in range(1, offsets[-1] + 1):
+                root = find(g)
+                if root == g:
+                    n += 1
+                    final[g] = n
+                else:
+                    final[g] = final[root]
+
+            run(_tiled_relabel_band, [(labels_memory.name, cols, start, end,
+                                       array('i', [0]) + final[offsets[b] + 1:offsets[b + 1] + 1])
+                                      for b, (start, end) in enumerate(tiles)])
+            result = array('i', labels[:rows * cols])
+        return n, result
+    finally:
+        if pool is not None:
+            pool.shutdown()
+        for memory in (mask_memory, labels_memory):
+            memory.close()
+            memory.unlink()
+
+
 # Dijkstra's algorithm for shortest paths
 
 
-def dijkstra(graph, start, end=None):
+class BucketQueue(object):
+    """
+    Dial's bucket queue: a monotone priority queue for integer keys, where every key pushed is between the last key
+    popped and that key + max_weight. Push and pop take O(1) amortised time.
+
+    >>> q = BucketQueue(3)
+    >>> q.push(2, 'b'); q.push(0, 'a'); q.push(3, 'c')
+    >>> q.pop(), q.pop()
+    ((0, 'a'), (2, 'b'))
+    >>> q.push(5, 'd')
+    >>> q.pop(), q.pop(), len(q)
+    ((3, 'c'), (5, 'd'), 0)
+    """
+
+    def __init__(self, max_weight):
+        self.buckets = [[] for _ in range(max_weight + 1)]
+        self.current = 0
+        self.size = 0
+
+    def push(self, key, item):
+        self.buckets[key % len(self.buckets)].append(item)
+        self.size += 1
+
+    def pop(self):
+        buckets = self.buckets
+        n = len(buckets)
+        bucket = buckets[self.current % n]
+        while not bucket:
+            self.current += 1
+            bucket = buckets[self.current % n]
+        self.size -= 1
+        return self.current, bucket.pop()
+
+    def __len__(self):
+        return self.size
+
+
+class RadixHeap(object):
+    """
+    A monotone priority queue for non-negative integer keys, where every key pushed is at least the last key popped.
+
+    Items are kept in buckets by the highest bit in which their key differs from the last key popped, so each item is
+    moved at most O(log C) times, where C is the largest key.
+
+    >>> q = RadixHeap()
+    >>> q.push(5, 'b'); q.push(1, 'a'); q.push(100, 'c')
+    >>> q.pop(), q.pop()
+    ((1, 'a'), (5, 'b'))
+    >>> q.push(7, 'd')
+    >>> q.pop(), q.pop(), len(q)
+    ((7, 'd'), (100, 'c'), 0)
+    >>> q.push(200, 'x'); q.push(200, 3)
+    >>> sorted(map(str, (q.pop(), q.pop())))
+    ["(200, 'x')", '(200, 3)']
+    """
+
+    def __init__(self):
+        self.last = 0
+        self.buckets = [[]]
+        self.size = 0
+
+    def push(self, key, item):
+        b = (key ^ self.last).bit_length()
+        buckets = self.buckets
+        while len(buckets) <= b:
+            buckets.append([])
+        buckets[b].append((key, item))
+        self.size += 1
+
+    def pop(self):
+        buckets = self.buckets
+        if not buckets[0]:
+            i = 1
+            while not buckets[i]:
+                i += 1
+            bucket = buckets[i]
+            buckets[i] = []
+            # Only the keys are compared, since the items need not be ordered
+            last = self.last = min([entry[0] for entry in bucket])
+            for entry in bucket:
+                buckets[(entry[0] ^ last).bit_length()].append(entry)
+        self.size -= 1
+        return buckets[0].pop()
+
+    def __len__(self):
+        return self.size
+
+
+# Largest edge weight for which dijkstra(queue='auto') uses a BucketQueue rather than a RadixHeap.
+DIAL_MAX_WEIGHT = 1000
+
+
+def dijkstra(graph, start, end=None, queue='heap', max_weight=None):
     """
     Find shortest paths from the start vertex to all
     vertices nearer than or equal to the end.
@@ -263,16 +1109,52 @@ def dijkstra(graph, start, end=None):
     [('s', 14), ('u', 8), ('v', 9), ('x', 5), ('y', 7)]
     >>> sorted(predecessors.items())
     [('s', 'y'), ('u', 'x'), ('v', 'u'), ('x', 's'), ('y', 'x')]
+
+    `queue` selects the priority queue:
+     - 'heap': a binary heap, for any non-negative weights.
+     - 'dial': a BucketQueue, for small non-negative integer weights.
+     - 'radix': a RadixHeap, for non-negative integer weights.
+     - 'bfs': a double-ended queue (0-1 BFS), for weights that are all 0 or 1.
+     - 'auto': one of the above, after inspecting all edge weights. A GridGraph with the default distance of 1 is
+       searched with 'bfs' without inspecting it.
+    All of them give the same distances.
+
+    'dial' and 'auto' need the range of the edge weights. A CSRGraph or FlatGrid computes it once and keeps it, so
+    its arrays should not be changed afterwards. Any other graph is scanned on every call, unless `max_weight`, the
+    largest edge weight, is given for 'dial'.
+
+    >>> sorted(dijkstra(G, 's', queue='dial')[0].items()) == sorted(dijkstra(G, 's')[0].items())
+    True
+    >>> dijkstra(G, 's', 'v', queue='dial', max_weight=10)[0]['v']
+    9
+    >>> _choose_queue(G), _choose_queue(GridGraph([[1]]))
+    ('dial', 'bfs')
     """
+    if queue == 'auto':
+        queue = _choose_queue(graph)
+    if queue == 'bfs':
+        return _dijkstra_01(graph, start, end)
+    elif queue == 'dial':
+        if max_weight is None:
+            max_weight = _weight_range(graph)[1]
+        return _dijkstra_queue(graph, start, end, BucketQueue(max(max_weight, 0)))
+    elif queue == 'radix':
+        return _dijkstra_queue(graph, start, end, RadixHeap())
+    elif queue != 'heap':
+        raise ValueError("Unknown queue %r" % queue)
+
+    if isinstance(graph, CSRGraph):
+        return _dijkstra_csr(graph, start, end)
+
     import heapq
 
     distances = {}  # dictionary of final distances
     predecessors = {}  # dictionary of predecessors (previous node)
-    queue = []  # queue
-    heapq.heappush(queue, (0, start))
+    heap = []  # queue
+    heapq.heappush(heap, (0, start))
 
-    while len(queue) > 0:
-        distance, node = heapq.heappop(queue)
+    while len(heap) > 0:
+        distance, node = heapq.heappop(heap)
         if node in distances and distance > distances[node]:
             continue
         if node == end:
@@ -287,12 +1169,596 @@ def dijkstra(graph, start, end=None):
                     continue
             distances[neighbour] = total
             predecessors[neighbour] = node
+            heapq.heappush(heap, (total, neighbour))
+
+    return distances, predecessors
+
+
+def _edge_iterator(graph):
+    """ A function (node, distance) -> iterable of (neighbour, weight), using the flat arrays of a CSRGraph. """
+    if isinstance(graph, CSRGraph):
+        offsets = graph.offsets
+        targets = graph.targets
+        weights = graph.weights
+
+        def edges(node, distance):
+            a = offsets[node]
+            b = offsets[node + 1]
+            return zip(targets[a:b], weights[a:b])
+        return edges
+
+    return lambda node, distance: graph.edges(node, distance=distance).items()
+
+
+def _weight_range(graph):
+    """
+    (lowest, highest, integral) over all edge weights of the graph, where integral is True if all weights are
+    integers. Returns (0, 0, True) for a graph without edges.
+
+    The result is kept on a CSRGraph or FlatGrid, so that repeated searches do not scan the weights again.
+    """
+    if isinstance(graph, (CSRGraph, FlatGrid)):
+        if graph._weight_range is None:
+            if isinstance(graph, FlatGrid):
+                weights = graph.costs
+                if weights is None:
+                    weights = [1]
+            else:
+                weights = graph.weights
+            if not weights:
+                graph._weight_range = (0, 0, True)
+            else:
+                integral = weights.typecode not in 'fd' if hasattr(weights, 'typecode') else True
+                graph._weight_range = (min(weights), max(weights), integral)
+        return graph._weight_range
+    low = high = None
+    integral = True
+    for node in graph.nodes():
+        for weight in graph.edges(node).values():
+            if low is None:
+                low = high = weight
+            elif weight < low:
+                low = weight
+            elif weight > high:
+                high = weight
+            if integral and not isinstance(weight, int):
+                integral = False
+    if low is None:
+        return 0, 0, True
+    return low, high, integral
+
+
+def _choose_queue(graph):
+    if isinstance(graph, GridGraph) and type(graph).distance is GridGraph.distance:
+        return 'bfs'
+    low, high, integral = _weight_range(graph)
+    if not integral or low < 0:
+        return 'heap'
+    if high <= 1:
+        return 'bfs'
+    if high <= DIAL_MAX_WEIGHT:
+        return 'dial'
+    return 'radix'
+
+
+def _dijkstra_queue(graph, start, end, queue):
+    """ dijkstra() with a monotone priority queue object that has push(key, item), pop() and len(). """
+    edges = _edge_iterator(graph)
+    distances = {}
+    predecessors = {}
+    queue.push(0, start)
+
+    while len(queue) > 0:
+        distance, node = queue.pop()
+        if node in distances and distance > distances[node]:
+            continue
+        if node == end:
+            break
+
+        for neighbour, length in edges(node, distance):
+            total = distance + length
+            if neighbour in distances:
+                if total >= distances[neighbour]:
+                    continue
+            distances[neighbour] = total
+            predecessors[neighbour] = node
+            queue.push(total, neighbour)
+
+    return distances, predecessors
+
+
+def _dijkstra_01(graph, start, end):
+    """
+    dijkstra() for weights that are all 0 or 1, using a double-ended queue: 0-weight edges go to the front, 1-weight
+    edges to the back. With unit weights only, this is a plain breadth first search.
+    """
+    from collections import deque
+
+    edges = _edge_iterator(graph)
+    distances = {}
+    predecessors = {}
+    queue = deque([(0, start)])
+
+    while queue:
+        distance, node = queue.popleft()
+        if node in distances and distance > distances[node]:
+            continue
+        if node == end:
+            break
+
+        for neighbour, length in edges(node, distance):
+            total = distance + length
+            if neighbour in distances:
+                if total >= distances[neighbour]:
+                    continue
+            distances[neighbour] = total
+            predecessors[neighbour] = node
+            if length:
+                queue.append((total, neighbour))
+            else:
+                queue.appendleft((total, neighbour))
+
+    return distances, predecessors
+
+
+def _dijkstra_csr(graph, start, end=None):
+    """
+    dijkstra() on the flat arrays of a CSRGraph, with lists instead of dictionaries for the intermediate state.
+    The result is identical to that of the generic implementation.
+    """
+    import heapq
+
+    offsets = graph.offsets
+    targets = graph.targets
+    weights = graph.weights
+    inf = float('inf')
+    dist = [inf] * graph.n
+    pred = [-1] * graph.n
+    reached = []
+    queue = [(0, start)]
+
+    while queue:
+        distance, node = heapq.heappop(queue)
+        if distance > dist[node]:
+            continue
+        if node == end:
+            break
+
+        a = offsets[node]
+        b = offsets[node + 1]
+        for neighbour, length in zip(targets[a:b], weights[a:b]):
+            total = distance + length
+            if total >= dist[neighbour]:
+                continue
+            if dist[neighbour] == inf:
+                reached.append(neighbour)
+            dist[neighbour] = total
+            pred[neighbour] = node
+            heapq.heappush(queue, (total, neighbour))
+
+    return {v: dist[v] for v in reached}, {v: pred[v] for v in reached}
+
+
+def multi_source_dijkstra(graph, sources, end=None):
+    """
+    Find shortest paths from the nearest of several sources, as if searching from a virtual super-source with an edge
+    to each of them.
+
+    `sources` is either an iterable of nodes, or a dictionary {node: initial distance}.
+
+    The output is a pair (D,P) like that of dijkstra(), except that every source is included in D. Following P from
+    a node leads back to its nearest source.
+
+    >>> g = GridGraph([[1, 1, 1, 1, 1]])
+    >>> distances, predecessors = multi_source_dijkstra(g, [(0, 0), (0, 4)])
+    >>> [distances[node] for node in g.nodes()]
+    [0, 1, 2, 1, 0]
+    >>> distances, predecessors = multi_source_dijkstra(g, {(0, 0): 0, (0, 4): 3})
+    >>> [distances[node] for node in g.nodes()]
+    [0, 1, 2, 3, 3]
+    """
+    import heapq
+
+    if not isinstance(sources, dict):
+        sources = dict.fromkeys(sources, 0)
+    edges = _edge_iterator(graph)
+    distances = dict(sources)
+    predecessors = {}
+    queue = [(distance, node) for node, distance in sources.items()]
+    heapq.heapify(queue)
+
+    while queue:
+        distance, node = heapq.heappop(queue)
+        if distance > distances[node]:
+            continue
+        if node == end:
+            break
+
+        for neighbour, length in edges(node, distance):
+            total = distance + length
+            if neighbour in distances and total >= distances[neighbour]:
+                continue
+            distances[neighbour] = total
+            predecessors[neighbour] = node
+            heapq.heappush(queue, (total, neighbour))
+
+    return distances, predecessors
+
+
+def floyd_warshall(graph):
+    """
+    Shortest distances between all pairs of nodes, in O(n^3) time. Edge weights may be negative, as long as there
+    are no negative cycles.
+
+    The output is a pair (nodes, matrix), where matrix[i][j] is the distance from nodes[i] to nodes[j], or infinity
+    if there is no path. The matrix is a NumPy array when NumPy is available, in which case each iteration is a
+    single vectorised operation. Otherwise it is a list of array('d') rows.
+
+    Raises ValueError if the graph has a negative cycle.
+
+    >>> G = DirectedGraph({'a': {'b': 4, 'c': 1}, 'c': {'b': 2}, 'b': {'d': 1}})
+    >>> nodes, matrix = floyd_warshall(G)
+    >>> nodes
+    ['a', 'b', 'c', 'd']
+    >>> [[float(d) for d in row] for row in matrix]
+    [[0.0, 3.0, 1.0, 4.0], [inf, 0.0, inf, 1.0], [inf, 2.0, 0.0, 3.0], [inf, inf, inf, 0.0]]
+    """
+    nodes = list(graph.nodes())
+    ids = {node: i for i, node in enumerate(nodes)}
+    n = len(nodes)
+    inf = float('inf')
+    try:
+        import numpy
+    except ImportError:
+        numpy = None
+
+    if numpy is not None:
+        matrix = numpy.full((n, n), inf)
+        numpy.fill_diagonal(matrix, 0)
+        for node in nodes:
+            i = ids[node]
+            for neighbour, weight in graph.edges(node).items():
+                j = ids[neighbour]
+                if weight < matrix[i, j]:
+                    matrix[i, j] = weight
+        for k in range(n):
+            numpy.minimum(matrix, matrix[:, k, None] + matrix[None, k, :], out=matrix)
+        if n and matrix.diagonal().min() < 0:
+            raise ValueError("Negative cycle")
+        return nodes, matrix
+
+    from array import array
+
+    matrix = [array('d', [inf]) * n for _ in range(n)]
+    for node in nodes:
+        i = ids[node]
+        row = matrix[i]
+        row[i] = 0
+        for neighbour, weight in graph.edges(node).items():
+            j = ids[neighbour]
+            if weight < row[j]:
+                row[j] = weight
+    for k in range(n):
+        through = matrix[k]
+        for i in range(n):
+            row = matrix[i]
+            d = row[k]
+            if d == inf:
+                continue
+            matrix[i] = array('d', map(min, row, [d + e for e in through]))
+    if any(matrix[i][i] < 0 for i in range(n)):
+        raise ValueError("Negative cycle")
+    return nodes, matrix
+
+
+# State of the worker processes in johnson(): the reweighted graph.
+_johnson_graph = None
+
+
+def _johnson_init(graph):
+    global _johnson_graph
+    _johnson_graph = graph
+
+
+def _johnson_row(source):
+    from array import array
+
+    distances, predecessors = _dijkstra_csr(_johnson_graph, source)
+    row = array('d', [float('inf')]) * _johnson_graph.n
+    for node, distance in distances.items():
+        row[node] = distance
+    row[source] = 0
+    return row
+
+
+def johnson(graph, processes=None):
+    """
+    Shortest distances between all pairs of nodes, using Johnson's algorithm: Bellman-Ford from a virtual source
+    gives potentials h that make all edge weights non-negative (w + h[u] - h[v]), after which dijkstra() is run from
+    every node. This takes O(nm log n) time, which is faster than floyd_warshall() on sparse graphs.
+
+    The per-source runs are spread over `processes` worker processes (default: one per CPU). With processes=1,
+    everything runs in this process.
+
+    The output is a pair (nodes, matrix), where matrix is a list of array('d') rows and matrix[i][j] is the distance
+    from nodes[i] to nodes[j], or infinity if there is no path.
+
+    Raises ValueError if the graph has a negative cycle.
+
+    >>> G = DirectedGraph({'a': {'b': 4, 'c': 1}, 'c': {'b': -2}, 'b': {'d': 1}})
+    >>> nodes, matrix = johnson(G, processes=1)
+    >>> nodes
+    ['a', 'b', 'c', 'd']
+    >>> [list(row) for row in matrix]
+    [[0.0, -1.0, 1.0, 0.0], [inf, 0.0, inf, 1.0], [inf, -2.0, 0.0, -1.0], [inf, inf, inf, 0.0]]
+    """
+    from array import array
+
+    if not isinstance(graph, CSRGraph):
+        graph = CSRGraph.from_graph(graph)
+    n = graph.n
+    nodes = [graph.label(node) for node in range(n)]
+    offsets = graph.offsets
+    targets = graph.targets
+    weights = graph.weights
+
+    # Bellman-Ford. The virtual source has a 0-weight edge to every node, so all potentials start at 0.
+    h = [0] * n
+    for _ in range(n + 1):
+        changed = False
+        for node in range(n):
+            hn = h[node]
+            for i in range(offsets[node], offsets[node + 1]):
+                total = hn + weights[i]
+                if total < h[targets[i]]:
+                    h[targets[i]] = total
+                    changed = True
+        if not changed:
+            break
+    else:
+        raise ValueError("Negative cycle")
+
+    reweighted = array(weights.typecode, weights)
+    for node in range(n):
+        for i in range(offsets[node], offsets[node + 1]):
+            reweighted[i] = max(weights[i] + h[node] - h[targets[i]], 0)
+    positive = CSRGraph(offsets, targets, reweighted)
+
+    if processes == 1:
+        _johnson_init(positive)
+        rows = [_johnson_row(source) for source in range(n)]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+
+        with ProcessPoolExecutor(processes, initializer=_johnson_init, initargs=(positive,)) as pool:
+            rows = list(pool.map(_johnson_row, range(n), chunksize=max(1, n // 64)))
+
+    for u in range(n):
+        row = rows[u]
+        hu = h[u]
+        for v in range(n):
+            row[v] += h[v] - hu
+    return nodes, rows
+
+
+def reverse_graph(graph):
+    """
+    The graph with all edges reversed, as a DirectedGraph, or as a CSRGraph for a CSRGraph.
+
+    >>> sorted(reverse_graph(DirectedGraph({1: {2: 5}})).edges(2).items())
+    [(1, 5)]
+    """
+    if isinstance(graph, CSRGraph):
+        from array import array
+
+        offsets = graph.offsets
+        sources = array(graph.targets.typecode)
+        for node in range(graph.n):
+            sources.extend(array(sources.typecode, [node]) * (offsets[node + 1] - offsets[node]))
+        return CSRGraph.from_edges(graph.n, graph.targets, sources, graph.weights, graph.labels)
+
+    result = DirectedGraph()
+    for node in graph.nodes():
+        result.G.setdefault(node, {})
+        for neighbour, weight in graph.edges(node).items():
+            result.add_edge(neighbour, node, weight)
+    return result
+
+
+class _ReversedGridGraph(Graph):
+    """
+    A GridGraph with the edges reversed. Neighbours in a grid are symmetric, so only the distances change: the edge
+    node -> neighbour has the distance of the original edge neighbour -> node.
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def edges(self, node, **kwargs):
+        graph = self.graph
+        return {neighbour: graph.distance(neighbour, node) for neighbour in graph.edges(node)}
+
+    def nodes(self):
+        return self.graph.nodes()
+
+
+def bidirectional_dijkstra(graph, start, end, reverse=None):
+    """
+    Find a shortest path from start to end by searching forward from start and backward from end at the same time,
+    stopping when the two searches meet. This settles far fewer nodes than dijkstra() on large graphs.
+
+    `reverse` is the graph with all edges reversed. By default, it is the graph itself for an UndirectedGraph or a
+    GridGraph with the default symmetric distance. A GridGraph with its own distance() is wrapped so that each
+    reversed edge has the distance of the original edge. A CSRGraph is reversed once and keeps the result for later
+    calls. Any other graph is converted with reverse_graph() on every call, which takes O(V + E): for repeated
+    queries on a DirectedGraph, build reverse_graph(graph) once and pass it, for example to shortest_path() with
+    search=functools.partial(bidirectional_dijkstra, reverse=reversed_graph).
+
+    The output is a pair (D,P) like that of dijkstra(): following P from end leads to start along a shortest path,
+    and D[end] is its length. end is missing from D if it cannot be reached.
+
+    >>> G = DirectedGraph({'s':{'u':10, 'x':5}, 'u':{'v':1, 'x':2}, 'v':{'y':4}, 'x':{'u':3, 'v':9, 'y':2}, \
+            'y':{'s':7, 'v':6}})
+    >>> distances, predecessors = bidirectional_dijkstra(G, 's', 'v')
+    >>> distances['v']
+    9
+    >>> shortest_path(G, 's', 'v', search=bidirectional_dijkstra)
+    ['s', 'x', 'u', 'v']
+
+    Grids whose distance is not symmetric are searched backward with reversed distances:
+
+    >>> class EntryCostGrid(GridGraph):
+    ...     def distance(self, a, b, **kwargs):
+    ...         return self.value(b)
+    >>> g = EntryCostGrid([[1, 5, 1, 1], [1, 1, 1, 9]])
+    >>> bidirectional_dijkstra(g, (0, 1), (1, 3))[0][(1, 3)], dijkstra(g, (0, 1))[0][(1, 3)]
+    (11, 11)
+
+    >>> from functools import partial
+    >>> R = reverse_graph(G)
+    >>> shortest_path(G, 's', 'y', search=partial(bidirectional_dijkstra, reverse=R))
+    ['s', 'x', 'y']
+    """
+    import heapq
+
+    if reverse is None:
+        if isinstance(graph, UndirectedGraph):
+            reverse = graph
+        elif isinstance(graph, GridGraph):
+            if type(graph).distance is GridGraph.distance:
+                reverse = graph
+            else:
+                reverse = _ReversedGridGraph(graph)
+        elif isinstance(graph, CSRGraph):
+            if graph._reverse is None:
+                graph._reverse = reverse_graph(graph)
+            reverse = graph._reverse
+        else:
+            reverse = reverse_graph(graph)
+
+    forward = (_edge_iterator(graph), {start: 0}, {}, [(0, start)])
+    backward = (_edge_iterator(reverse), {end: 0}, {}, [(0, end)])
+    best = 0 if start == end else float('inf')
+    meet = start if start == end else None
+
+    while forward[3] and backward[3]:
+        if forward[3][0][0] + backward[3][0][0] >= best:
+            break
+        # Expand the side with the smaller frontier distance
+        if forward[3][0][0] <= backward[3][0][0]:
+            edges, distances, predecessors, queue = forward
+            other = backward[1]
+        else:
+            edges, distances, predecessors, queue = backward
+            other = forward[1]
+        distance, node = heapq.heappop(queue)
+        if distance > distances[node]:
+            continue
+        for neighbour, length in edges(node, distance):
+            total = distance + length
+            if neighbour in distances and total >= distances[neighbour]:
+                continue
+            distances[neighbour] = total
+            predecessors[neighbour] = node
             heapq.heappush(queue, (total, neighbour))
+            if neighbour in other and total + other[neighbour] < best:
+                best = total + other[neighbour]
+                meet = neighbour
+
+    distances, predecessors = forward[1], forward[2]
+    if meet is not None:
+        # Continue the forward predecessors along the backward half of the path
+        back_distances, successors = backward[1], backward[2]
+        node = meet
+        while node != end:
+            next = successors[node]
+            predecessors[next] = node
+            distances[next] = best - back_distances[next]
+            node = next
+    return distances, predecessors
+
+
+def manhattan(a, b):
+    """
+    Manhattan distance between two (row, col) positions. An admissible A* heuristic for 4-connected grids with unit
+    steps.
+
+    >>> manhattan((0, 0), (3, -4))
+    7
+    """
+    return abs(a[0] - b[0]) + abs(a[1] - b[1])
+
+
+def chebyshev(a, b):
+    """
+    Chebyshev distance between two (row, col) positions. An admissible A* heuristic for 8-connected grids with unit
+    steps.
+
+    >>> chebyshev((0, 0), (3, -4))
+    4
+    """
+    return max(abs(a[0] - b[0]), abs(a[1] - b[1]))
+
+
+def euclidean(a, b):
+    """
+    Euclidean distance between two positions. An admissible A* heuristic whenever each edge is at least as long as
+    the straight line between its nodes.
+
+    >>> euclidean((0, 0), (3, -4))
+    5.0
+    """
+    import math
+    return math.hypot(a[0] - b[0], a[1] - b[1])
+
+
+def astar(graph, start, end, heuristic=None):
+    """
+    A* search for a shortest path from start to end.
+
+    heuristic(node, end) must never overestimate the distance from node to end, for example manhattan() on a
+    GridGraph. Without a heuristic, this is the same as dijkstra(graph, start, end).
+
+    The output is a pair (D,P) like that of dijkstra().
+
+    >>> g = GridGraph([[1, 1, 1, 1], [1, 0, 0, 1], [1, 1, 1, 1]])
+    >>> distances, predecessors = astar(g, (0, 0), (2, 3), manhattan)
+    >>> distances[(2, 3)]
+    5
+    >>> len(shortest_path(g, (0, 0), (2, 3), search=lambda *args: astar(*args, heuristic=manhattan)))
+    6
+    """
+    import heapq
+
+    if heuristic is None:
+        heuristic = lambda node, end: 0
+
+    edges = _edge_iterator(graph)
+    distances = {start: 0}
+    predecessors = {}
+    # Ties on the estimate are broken in favour of the longest distance so far, which is closest to end
+    queue = [(heuristic(start, end), 0, start)]
+
+    while queue:
+        estimate, distance, node = heapq.heappop(queue)
+        distance = -distance
+        if distance > distances[node]:
+            continue
+        if node == end:
+            break
+
+        for neighbour, length in edges(node, distance):
+            total = distance + length
+            if neighbour in distances and total >= distances[neighbour]:
+                continue
+            distances[neighbour] = total
+            predecessors[neighbour] = node
+            heapq.heappush(queue, (total + heuristic(neighbour, end), -total, neighbour))
 
     return distances, predecessors
 
 
-def shortest_path(graph, start, end):
+def shortest_path(graph, start, end, search=dijkstra):
     """
     Find a single shortest path from the given start vertex
     to the given end vertex.
@@ -300,13 +1766,16 @@ def shortest_path(graph, start, end):
     The output is a list of the vertices in order along
     the shortest path.
 
+    `search` is the search function to use, called as search(graph, start, end). It may also be
+    bidirectional_dijkstra, or astar with a heuristic.
+
     >>> G = DirectedGraph({'s':{'u':10, 'x':5}, 'u':{'v':1, 'x':2}, 'v':{'y':4}, 'x':{'u':3, 'v':9, 'y':2}, \
             'y':{'s':7, 'v':6}})
     >>> shortest_path(G, 's', 'v')
     ['s', 'x', 'u', 'v']
     """
 
-    distances, predecessors = dijkstra(graph, start, end)
+    distances, predecessors = search(graph, start, end)
     path = []
     while 1:
         path.append(end)
@@ -316,5 +1785,901 @@ def shortest_path(graph, start, end):
     return path
 
 
-# TODO: minimum spanning tree
+class _ShortestPathTree(object):
+    """ The state of a Dijkstra search from start that can be resumed to settle more nodes. """
+
+    def __init__(self, graph, start):
+        self.edges = _edge_iterator(graph)
+        self.start = start
+        self.distances = {start: 0}
+        self.predecessors = {}
+        self.settled = set()
+        self.queue = [(0, start)]
+
+    def settle(self, end=None):
+        """ Continues the search until end is settled, or until all reachable nodes are if end is None. """
+        import heapq
+
+        distances = self.distances
+        predecessors = self.predecessors
+        settled = self.settled
+        queue = self.queue
+        edges = self.edges
+        while queue and end not in settled:
+            distance, node = heapq.heappop(queue)
+            if node in settled:
+                continue
+            settled.add(node)
+            for neighbour, length in edges(node, distance):
+                total = distance + length
+                if neighbour in distances and total >= distances[neighbour]:
+                    continue
+                distances[neighbour] = total
+                predecessors[neighbour] = node
+                heapq.heappush(queue, (total, neighbour))
+
+    def size(self):
+        return len(self.distances) + len(self.queue)
+
+
+class ShortestPathCache(object):
+    """
+    Answers repeated shortest path queries, keeping the shortest path tree of each recently used start node.
+
+    A search stops as soon as the end node is settled. If a later query from the same start asks for a node that is
+    not settled yet, the search resumes where it stopped instead of starting over.
+
+    Trees are evicted in least recently used order when there are more than max_trees (at least 1), or when they
+    hold more than max_nodes entries in total, as a budget for memory use.
+
+    `hits` counts queries answered from a cached tree, `resumes` those that had to continue a cached search, and
+    `misses` those that started a new search.
+
+    >>> G = DirectedGraph({'s':{'u':10, 'x':5}, 'u':{'v':1, 'x':2}, 'v':{'y':4}, 'x':{'u':3, 'v':9, 'y':2}, \
+            'y':{'s':7, 'v':6}})
+    >>> cache = ShortestPathCache(G)
+    >>> cache.shortest_path('s', 'u'), cache.distance('s', 'x'), cache.distance('s', 'v')
+    (['s', 'x', 'u'], 5, 9)
+    >>> cache.stats()
+    {'hits': 1, 'resumes': 1, 'misses': 1, 'evictions': 0, 'trees': 1, 'size': 8}
+    >>> cache.distance('v', 'missing') is None
+    True
+    >>> ShortestPathCache(G, max_trees=0)
+    Traceback (most recent call last):
+    ...
+    ValueError: max_trees must be at least 1, got 0
+    """
+
+    def __init__(self, graph, max_trees=16, max_nodes=10 ** 7):
+        from collections import OrderedDict
+
+        if max_trees < 1:
+            raise ValueError("max_trees must be at least 1, got %r" % max_trees)
+        self.graph = graph
+        self.max_trees = max_trees
+        self.max_nodes = max_nodes
+        self.trees = OrderedDict()
+        self.total = 0
+        self.hits = 0
+        self.resumes = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def tree(self, start, end=None):
+        """
+        The shortest path tree from start, with at least end settled, or every reachable node if end is None.
+
+        The output is a pair (D,P) like that of dijkstra(), except that D[start] is 0. The dictionaries are shared
+        with the cache, and must not be modified.
+        """
+        tree = self.trees.get(start)
+        if tree is None:
+            self.misses += 1
+            tree = self.trees[start] = _ShortestPathTree(self.graph, start)
+            before = 0
+        else:
+            self.trees.move_to_end(start)
+            if end in tree.settled or not tree.queue:
+                self.hits += 1
+                return tree.distances, tree.predecessors
+            self.resumes += 1
+            before = tree.size()
+        tree.settle(end)
+        self.total += tree.size() - before
+        self._evict(start)
+        return tree.distances, tree.predecessors
+
+    def _evict(self, keep):
+        trees = self.trees
+        while len(trees) > self.max_trees or (self.total > self.max_nodes and len(trees) > 1):
+            start = next(iter(trees))
+            if start == keep:
+                trees.move_to_end(start)
+                continue
+            self.total -= trees.pop(start).size()
+            self.evictions += 1
+
+    def distance(self, start, end):
+        """ The length of a shortest path from start to end, or None if there is no path. """
+        distances, predecessors = self.tree(start, end)
+        if end not in self.trees[start].settled:
+            return None
+        return distances[end]
+
+    def shortest_path(self, start, end):
+        """ A shortest path from start to end as a list of nodes, or None if there is no path. """
+        distances, predecessors = self.tree(start, end)
+        if end not in self.trees[start].settled:
+            return None
+        path = [end]
+        while end != start:
+            end = predecessors[end]
+            path.append(end)
+        path.reverse()
+        return path
+
+    def stats(self):
+        return {'hits': self.hits, 'resumes': self.resumes, 'misses': self.misses, 'evictions': self.evictions,
+                'trees': len(self.trees), 'size': self.total}
+
+
+# Minimum spanning tree
+
+
+class DisjointSet(object):
+    """
+    Union-find over the integers 0..n-1, with path compression and union by rank, stored in flat arrays.
+    Both operations take nearly constant amortised time.
+
+    `count` is the number of sets, and size(x) the number of elements in the set of x.
+
+    >>> d = DisjointSet(5)
+    >>> d.union(0, 1), d.union(3, 4), d.union(1, 0)
+    (True, True, False)
+    >>> d.find(0) == d.find(1), d.find(1) == d.find(3)
+    (True, False)
+    >>> d.count, d.size(4), d.add(), d.count
+    (3, 2, 5, 4)
+    """
+
+    def __init__(self, n):
+        from array import array
+
+        typecode = 'i' if n < 2 ** 31 else 'q'
+        self.parent = array(typecode, range(n))
+        self.rank = bytearray(n)
+        self.sizes = array(typecode, [1]) * n
+        self.count = n
+
+    def add(self):
+        """ Adds a new element in a set of its own, and returns it. """
+        x = len(self.parent)
+        self.parent.append(x)
+        self.rank.append(0)
+        self.sizes.append(1)
+        self.count += 1
+        return x
+
+    def find(self, x):
+        parent = self.parent
+        root = x
+        while parent[root] != root:
+            root = parent[root]
+        while parent[x] != root:
+            parent[x], x = root, parent[x]
+        return root
+
+    def union(self, a, b):
+        """ Merges the sets of a and b. Returns False if they were already the same set. """
+        a = self.find(a)
+        b = self.find(b)
+        if a == b:
+            return False
+        rank = self.rank
+        if rank[a] < rank[b]:
+            a, b = b, a
+        self.parent[b] = a
+        self.sizes[a] += self.sizes[b]
+        self.count -= 1
+        if rank[a] == rank[b]:
+            rank[a] += 1
+        return True
+
+    def size(self, x):
+        return self.sizes[self.find(x)]
+
+
+def kruskal_edges(n, sources, targets, weights):
+    """
+    Kruskal's algorithm on parallel sequences (for example arrays) of undirected edges between nodes 0..n-1.
+
+    Only edge indices are sorted and no per-edge objects are created, so this handles very large edge lists.
+
+    Returns (total, chosen), where chosen is an array of the indices of the edges in a minimum spanning forest.
+
+    >>> kruskal_edges(4, [0, 1, 2, 0, 1], [1, 2, 3, 3, 3], [1, 5, 2, 4, 3])
+    (6, array('q', [0, 2, 4]))
+    """
+    from array import array
+
+    sets = DisjointSet(n)
+    union = sets.union
+    chosen = array('q')
+    total = 0
+    for i in sorted(range(len(weights)), key=weights.__getitem__):
+        if not union(sources[i], targets[i]):
+            continue
+        chosen.append(i)
+        total += weights[i]
+        if len(chosen) == n - 1:
+            break
+    return total, chosen
+
+
+def _undirected_edge_arrays(graph):
+    """ (nodes, sources, targets, weights) for a Graph, with each undirected edge once, using node ids. """
+    if isinstance(graph, CSRGraph):
+        nodes = list(range(graph.n))
+    else:
+        nodes = list(graph.nodes())
+    ids = {node: i for i, node in enumerate(nodes)}
+    sources = []
+    targets = []
+    weights = []
+    for i, node in enumerate(nodes):
+        for neighbour, weight in graph.edges(node).items():
+            j = ids[neighbour]
+            if i < j:
+                sources.append(i)
+                targets.append(j)
+                weights.append(weight)
+    return nodes, sources, targets, weights
+
+
+def kruskal(graph):
+    """
+    A minimum spanning forest of an undirected Graph, such as an UndirectedGraph or GridGraph, using Kruskal's
+    algorithm.
+
+    Returns (total, edges), where edges is a list of (a, b, weight).
+
+    >>> g = UndirectedGraph({'a': {'b': 1, 'd': 4}, 'b': {'c': 5, 'd': 3}, 'c': {'d': 2}})
+    >>> kruskal(g)
+    (6, [('a', 'b', 1), ('d', 'c', 2), ('b', 'd', 3)])
+    >>> kruskal(GridGraph([[1, 1], [1, 0]]))[0]
+    2
+    """
+    nodes, sources, targets, weights = _undirected_edge_arrays(graph)
+    total, chosen = kruskal_edges(len(nodes), sources, targets, weights)
+    return total, [(nodes[sources[i]], nodes[targets[i]], weights[i]) for i in chosen]
+
+
+def _prim_dense(n, offsets, edge_targets, edge_weights, best, parent, order):
+    """
+    Prim's algorithm that selects the next node by scanning the list of best weights, O(V^2). min() and index() run
+    in C, so this beats a heap when most pairs of nodes have an edge.
+    """
+    inf = best[0]
+    done = bytearray(n)
+    root = 0
+    while root >= 0:
+        v = root
+        while True:
+            done[v] = 1
+            best[v] = inf
+            order.append(v)
+            for p in range(offsets[v], offsets[v + 1]):
+                u = edge_targets[p]
+                if edge_weights[p] < best[u] and not done[u]:
+                    best[u] = edge_weights[p]
+                    parent[u] = p
+            lowest = min(best)
+            if lowest == inf:
+                break
+            v = best.index(lowest)
+        root = done.find(0, root)
+
+
+def _prim_heap(n, offsets, edge_targets, edge_weights, best, parent, order):
+    """
+    Prim's algorithm with an indexed binary heap of nodes keyed by best weight, O(E log V). A better edge to a node
+    in the heap moves it up in place, so the heap never holds more than V entries. The keys are kept in a list
+    parallel to the heap, so that sifting does not look them up through the nodes.
+    """
+    from array import array
+
+    done = bytearray(n)
+    # position[v] is the index of v in heap, or -1
+    position = array('q', [-1]) * n
+    heap = []
+    keys = []
+    root = 0
+    while root >= 0:
+        heap.append(root)
+        keys.append(0)
+        position[root] = 0
+        while heap:
+            v = heap[0]
+            last = heap.pop()
+            key = keys.pop()
+            size = len(heap)
+            if size:
+                # Sift last down from the root
+                i = 0
+                child = 1
+                while child < size:
+                    right = child + 1
+                    if right < size and keys[right] < keys[child]:
+                        child = right
+                    if keys[child] >= key:
+                        break
+                    u = heap[i] = heap[child]
+                    keys[i] = keys[child]
+                    position[u] = i
+                    i = child
+                    child = 2 * i + 1
+                heap[i] = last
+                keys[i] = key
+                position[last] = i
+            position[v] = -1
+            done[v] = 1
+            order.append(v)
+            for p in range(offsets[v], offsets[v + 1]):
+                u = edge_targets[p]
+                w = edge_weights[p]
+                if w >= best[u] or done[u]:
+                    continue
+                best[u] = w
+                parent[u] = p
+                i = position[u]
+                if i < 0:
+                    i = len(heap)
+                    heap.append(u)
+                    keys.append(w)
+                # Sift u up
+                while i:
+                    up = (i - 1) >> 1
+                    if keys[up] <= w:
+                        break
+                    x = heap[i] = heap[up]
+                    keys[i] = keys[up]
+                    position[x] = i
+                    i = up
+                heap[i] = u
+                keys[i] = w
+                position[u] = i
+        root = done.find(0, root)
+
+
+def _prim(n, sources, targets, weights, dense):
+    """
+    Returns (order, chosen): the nodes in the order they were added, and the index of the edge to each node, or -1
+    for the first node of each tree.
+    """
+    from array import array
+    from collections import Counter
+    from itertools import accumulate
+
+    m = len(weights)
+    if dense is None:
+        dense = 64 * m >= n * n
+    # Adjacency in CSR form over both directions of each edge. Entry k < m is edge k from its source, entry k + m
+    # the same edge from its target.
+    ends = list(sources)
+    ends += targets
+    others = list(targets)
+    others += sources
+    counts = Counter(ends)
+    offsets = array('q', [0])
+    offsets.extend(accumulate(counts.get(i, 0) for i in range(n)))
+    entries = sorted(range(2 * m), key=ends.__getitem__)
+    edge_targets = array(_index_typecode(n), map(others.__getitem__, entries))
+    edge_weights = list(weights)
+    edge_weights += edge_weights
+    edge_weights = list(map(edge_weights.__getitem__, entries))
+
+    best = [float('inf')] * n
+    parent = array('q', [-1]) * n
+    order = array(_index_typecode(n))
+    if n:
+        search = _prim_dense if dense else _prim_heap
+        search(n, offsets, edge_targets, edge_weights, best, parent, order)
+    chosen = array('q', [-1]) * n
+    for v in order:
+        if parent[v] >= 0:
+            chosen[v] = entries[parent[v]] % m
+    return order, chosen
+
+
+def prim_edges(n, sources, targets, weights, dense=None):
+    """
+    Prim's algorithm on parallel sequences (for example arrays) of undirected edges between nodes 0..n-1, like
+    kruskal_edges().
+
+    Each node keeps the weight and index of its best edge to the tree, so no per-edge objects are created. The next
+    node is taken from an indexed heap with decrease-key in O(E log V), or, with dense=True, by scanning the best
+    weights in O(V^2), which is faster when most pairs of nodes have an edge. By default the scan is used when there
+    are at least V^2 / 64 edges.
+
+    Every edge is relaxed in Python, while kruskal_edges() sorts the edges in C and usually stops before reaching the
+    heaviest ones, so kruskal_edges() is often faster on edge lists that are already in memory.
+
+    Returns (total, chosen), where chosen is an array of the indices of the edges in a minimum spanning forest, in
+    the order they were added.
+
+    >>> prim_edges(4, [0, 1, 2, 0, 1], [1, 2, 3, 3, 3], [1, 5, 2, 4, 3])
+    (6, array('q', [0, 4, 2]))
+    >>> prim_edges(4, [0, 1, 2, 0, 1], [1, 2, 3, 3, 3], [1, 5, 2, 4, 3], dense=True)
+    (6, array('q', [0, 4, 2]))
+    """
+    from array import array
+
+    order, parent = _prim(n, sources, targets, weights, dense)
+    chosen = array('q', [parent[v] for v in order if parent[v] >= 0])
+    return sum(map(weights.__getitem__, chosen)), chosen
+
+
+def prim(graph, dense=None):
+    """
+    A minimum spanning forest of an undirected Graph, using Prim's algorithm (see prim_edges() for `dense`).
+
+    Returns (total, edges), where edges is a list of (a, b, weight) in the order they were added.
+
+    >>> g = UndirectedGraph({'a': {'b': 1, 'd': 4}, 'b': {'c': 5, 'd': 3}, 'c': {'d': 2}})
+    >>> prim(g)
+    (6, [('a', 'b', 1), ('b', 'd', 3), ('d', 'c', 2)])
+    >>> prim(GridGraph([[1, 1], [1, 0]]))[0]
+    2
+    """
+    nodes, sources, targets, weights = _undirected_edge_arrays(graph)
+    order, parent = _prim(len(nodes), sources, targets, weights, dense)
+    total = 0
+    result = []
+    for v in order:
+        e = parent[v]
+        if e < 0:
+            continue
+        u = sources[e] if targets[e] == v else targets[e]
+        result.append((nodes[u], nodes[v], weights[e]))
+        total += weights[e]
+    return total, result
+
+
+# Connectivity under changes
+
+
+class IncrementalConnectivity(object):
+    """
+    Keeps track of the connected components of an undirected graph while edges and nodes are added, without
+    recomputing a floodfill. Each change and query takes nearly constant amortised time.
+
+    The graph may be an UndirectedGraph (or a DirectedGraph whose edges are treated as undirected) or a GridGraph.
+    Changes are made through add_edge() and activate(), which also update the graph itself.
+
+    >>> g = UndirectedGraph({1: {2: 1}, 3: {4: 1}})
+    >>> c = IncrementalConnectivity(g)
+    >>> c.count, c.size(1), c.connected(1, 3)
+    (2, 2, False)
+    >>> c.add_edge(2, 3)
+    >>> c.count, c.size(1), c.connected(1, 3)
+    (1, 4, True)
+    >>> c.add_node(5)
+    >>> c.count
+    2
+
+    >>> grid = GridGraph([[1, 0, 1], [0, 0, 1]])
+    >>> c = IncrementalConnectivity(grid)
+    >>> c.count
+    2
+    >>> c.activate((0, 1), 1)
+    >>> c.count, c.size((0, 0)), c.component((0, 0)) == c.component((1, 2))
+    (1, 4, True)
+    """
+
+    def __init__(self, graph):
+        self.graph = graph
+        self.ids = {}
+        self.sets = DisjointSet(0)
+        for node in graph.nodes():
+            self._id(node)
+        for node in list(self.ids):
+            for neighbour in graph.edges(node):
+                self.sets.union(self.ids[node], self._id(neighbour))
+
+    def _id(self, node):
+        i = self.ids.get(node)
+        if i is None:
+            i = self.ids[node] = self.sets.add()
+        return i
+
+    @property
+    def count(self):
+        """ The number of connected components. """
+        return self.sets.count
+
+    def add_node(self, node):
+        """ Adds a node without edges, as a component of its own. """
+        if node not in self.ids:
+            if isinstance(self.graph, DirectedGraph):
+                self.graph.G.setdefault(node, {})
+            self._id(node)
+
+    def add_edge(self, a, b, weight=1):
+        """ Adds an edge to the graph, merging the components of a and b. """
+        self.graph.add_edge(a, b, weight)
+        self.sets.union(self._id(a), self._id(b))
+
+    def activate(self, cell, value=None):
+        """
+        For a GridGraph: makes a cell passable, setting its value if given, and merges it with its passable
+        neighbours.
+        """
+        if value is not None:
+            self.graph.grid[cell[0]][cell[1]] = value
+        if not self.graph.node_filter(cell):
+            return
+        i = self._id(cell)
+        for neighbour in self.graph.edges(cell):
+            self.sets.union(i, self._id(neighbour))
+
+    def component(self, node):
+        """ An id for the component of node. Ids stay valid until the next change. """
+        return self.sets.find(self.ids[node])
+
+    def connected(self, a, b):
+        return self.component(a) == self.component(b)
+
+    def size(self, node):
+        """ The number of nodes in the component of node. """
+        return self.sets.size(self.ids[node])
+
+
+class RollbackDisjointSet(object):
+    """
+    Union-find that can undo unions in reverse order. It uses union by rank without path compression, so that each
+    union changes O(1) entries, and find takes O(log n).
+
+    >>> d = RollbackDisjointSet(4)
+    >>> d.union(0, 1)
+    True
+    >>> checkpoint = d.snapshot()
+    >>> d.union(1, 2), d.count
+    (True, 2)
+    >>> d.rollback(checkpoint)
+    >>> d.find(2) == d.find(0), d.count
+    (False, 3)
+    """
+
+    def __init__(self, n):
+        from array import array
+
+        self.parent = array('i' if n < 2 ** 31 else 'q', range(n))
+        self.rank = bytearray(n)
+        self.count = n
+        self.history = []
+
+    def find(self, x):
+        parent = self.parent
+        while parent[x] != x:
+            x = parent[x]
+        return x
+
+    def union(self, a, b):
+        a = self.find(a)
+        b = self.find(b)
+        if a == b:
+            return False
+        rank = self.rank
+        if rank[a] < rank[b]:
+            a, b = b, a
+        grew = rank[a] == rank[b]
+        self.parent[b] = a
+        if grew:
+            rank[a] += 1
+        self.count -= 1
+        self.history.append((b, grew))
+        return True
+
+    def snapshot(self):
+        return len(self.history)
+
+    def rollback(self, snapshot):
+        """ Undoes all unions done since the snapshot was taken. """
+        history = self.history
+        parent = self.parent
+        while len(history) > snapshot:
+            b, grew = history.pop()
+            a = parent[b]
+            parent[b] = b
+            if grew:
+                self.rank[a] -= 1
+            self.count += 1
+
+
+def offline_connectivity(n, events):
+    """
+    Answers connectivity queries on nodes 0..n-1 while undirected edges are added and removed, given all events up
+    front. Each edge is active for an interval of the queries, and is added to the nodes of a segment tree over the
+    queries covering that interval. A depth first walk of the tree applies the edges with a RollbackDisjointSet and
+    undoes them on the way back. O((n + m) log m log n) in total for m events.
+
+    Events are ('add', a, b), ('remove', a, b), ('connected', a, b) and ('count',). Returns the answers to the
+    'connected' and 'count' events in order.
+
+    >>> offline_connectivity(3, [('add', 0, 1), ('connected', 0, 1), ('add', 1, 2), ('count',), ('remove', 0, 1),
+    ...                          ('connected', 0, 2), ('count',)])
+    [True, 1, False, 2]
+    """
+    queries = []
+    active = {}
+    intervals = []
+    for event in events:
+        kind = event[0]
+        if kind == 'add' or kind == 'remove':
+            a, b = event[1], event[2]
+            key = (a, b) if a <= b else (b, a)
+            if kind == 'add':
+                active.setdefault(key, []).append(len(queries))
+            else:
+                intervals.append((active[key].pop(), len(queries), key))
+        else:
+            queries.append(event)
+    for key, starts in active.items():
+        for start in starts:
+            intervals.append((start, len(queries), key))
+
+    q = len(queries)
+    if q == 0:
+        return []
+    size = 1
+    while size < q:
+        size *= 2
+    tree = [[] for _ in range(2 * size)]
+    for start, end, key in intervals:
+        lo = start + size
+        hi = end + size
+        while lo < hi:
+            if lo & 1:
+                tree[lo].append(key)
+                lo += 1
+            if hi & 1:
+                hi -= 1
+                tree[hi].append(key)
+            lo //= 2
+            hi //= 2
+
+    sets = RollbackDisjointSet(n)
+    answers = [None] * q
+    # Iterative depth first walk; a negative entry means "leave this tree node"
+    stack = [1]
+    snapshots = [0] * (2 * size)
+    while stack:
+        node = stack.pop()
+        if node < 0:
+            sets.rollback(snapshots[-node])
+            continue
+        snapshots[node] = sets.snapshot()
+        for a, b in tree[node]:
+            sets.union(a, b)
+        stack.append(-node)
+        if node >= size:
+            i = node - size
+            if i < q:
+                query = queries[i]
+                if query[0] == 'connected':
+                    answers[i] = sets.find(query[1]) == sets.find(query[2])
+                else:
+                    answers[i] = sets.count
+        else:
+            stack.append(2 * node + 1)
+            stack.append(2 * node)
+    return answers
+
+
+# Strongly connected components and topological order
+
+
+def _csr(graph, weights=False):
+    """
+    graph itself if it is a CSRGraph, otherwise its conversion. Unlike CSRGraph.from_graph(), the weights are not
+    packed into an array, since they may be of any type: they are a list if weights is True, otherwise None.
+    """
+    from array import array
+
+    if isinstance(graph, CSRGraph):
+        return graph
+    labels = list(graph.nodes())
+    ids = {label: i for i, label in enumerate(labels)}
+    offsets = array('q', [0])
+    targets = array(_index_typecode(len(labels)))
+    flat_weights = [] if weights else None
+    for label in labels:
+        edges = graph.edges(label)
+        targets.extend(map(ids.__getitem__, edges.keys()))
+        if weights:
+            flat_weights.extend(edges.values())
+        offsets.append(len(targets))
+    result = CSRGraph(offsets, targets, flat_weights, labels)
+    result._ids = ids
+    return result
+
+
+def _scc_csr(graph):
+    """
+    Iterative Tarjan's algorithm on the arrays of a CSRGraph. Returns (n, component), with component an array of
+    component numbers in topological order of the condensation.
+    """
+    from array import array
+
+    offsets = graph.offsets
+    targets = graph.targets
+    size = graph.n
+    typecode = _index_typecode(size)
+    index = array(typecode, [-1]) * size
+    low = array(typecode, [0]) * size
+    component = array(typecode, [-1]) * size
+    # The next edge to visit for each node on the call stack
+    position = array('q', offsets)
+    stack = []
+    counter = 0
+    n = 0
+    for root in range(size):
+        if index[root] >= 0:
+            continue
+        index[root] = low[root] = counter
+        counter += 1
+        stack.append(root)
+        calls = [root]
+        while calls:
+            v = calls[-1]
+            p = position[v]
+            end = offsets[v + 1]
+            while p < end:
+                w = targets[p]
+                p += 1
+                if index[w] < 0:
+                    position[v] = p
+                    index[w] = low[w] = counter
+                    counter += 1
+                    stack.append(w)
+                    calls.append(w)
+                    break
+                if component[w] < 0 and index[w] < low[v]:
+                    low[v] = index[w]
+            else:
+                position[v] = p
+                calls.pop()
+                if low[v] == index[v]:
+                    while True:
+                        w = stack.pop()
+                        component[w] = n
+                        if w == v:
+                            break
+                    n += 1
+                if calls:
+                    u = calls[-1]
+                    if low[v] < low[u]:
+                        low[u] = low[v]
+    # Tarjan's algorithm finds the components in reverse topological order
+    last = n - 1
+    for v in range(size):
+        component[v] = last - component[v]
+    return n, component
+
+
+def strongly_connected_components(graph):
+    """
+    Finds the strongly connected components of a directed graph with an iterative Tarjan's algorithm, so that deep
+    graphs do not hit the recursion limit. O(V + E).
+
+    Components are numbered 0..n-1 in topological order: every edge between two components goes from a lower to a
+    higher number.
+
+    Result: (n, {node => i}). For a CSRGraph the mapping is an array indexed by node id.
+
+    >>> g = DirectedGraph({'a': {'b': 1}, 'b': {'c': 1, 'd': 1}, 'c': {'a': 1}, 'd': {'e': 1}, 'e': {'d': 1}})
+    >>> n, c = strongly_connected_components(g)
+    >>> n
+    2
+    >>> sorted(c.items())
+    [('a', 0), ('b', 0), ('c', 0), ('d', 1), ('e', 1)]
+    >>> strongly_connected_components(CSRGraph.from_edges(3, [0, 1, 2], [1, 0, 1]))
+    (2, array('i', [1, 1, 0]))
+    >>> strongly_connected_components(DirectedGraph({1: {2: None}, 2: {1: 2 ** 64}}))
+    (1, {1: 0, 2: 0})
+    """
+    csr = _csr(graph)
+    n, component = _scc_csr(csr)
+    if csr is graph:
+        return n, component
+    return n, dict(zip(csr.labels, component))
+
+
+def _topological_sort_csr(graph):
+    """ Kahn's algorithm on the arrays of a CSRGraph. Returns the order as an array, or None if there is a cycle. """
+    from array import array
+
+    offsets = graph.offsets
+    targets = graph.targets
+    size = graph.n
+    typecode = _index_typecode(size)
+    indegree = array(typecode, [0]) * size
+    for w in targets:
+        indegree[w] += 1
+    order = array(typecode, [v for v in range(size) if not indegree[v]])
+    i = 0
+    while i < len(order):
+        v = order[i]
+        i += 1
+        for w in targets[offsets[v]:offsets[v + 1]]:
+            indegree[w] -= 1
+            if not indegree[w]:
+                order.append(w)
+    if len(order) < size:
+        return None
+    return order
 
+
+def topological_sort(graph):
+    """
+    Orders the nodes of a directed acyclic graph so that every edge goes from an earlier to a later node. O(V + E).
+
+    Raises ValueError if the graph has a cycle. For a CSRGraph the result is an array of node ids.
+
+    >>> topological_sort(DirectedGraph({'shirt': {'tie': 1}, 'tie': {'jacket': 1}, 'trousers': {'jacket': 1}}))
+    ['shirt', 'trousers', 'tie', 'jacket']
+    >>> topological_sort(DirectedGraph({1: {2: 1}, 2: {1: 1}}))
+    Traceback (most recent call last):
+        ...
+    ValueError: graph has a cycle
+    """
+    csr = _csr(graph)
+    order = _topological_sort_csr(csr)
+    if order is None:
+        raise ValueError("graph has a cycle")
+    if csr is graph:
+        return order
+    return list(map(csr.labels.__getitem__, order))
+
+
+def condensation(graph):
+    """
+    Contracts each strongly connected component to a single node, which gives a directed acyclic graph.
+
+    The nodes of the condensation are the component numbers of strongly_connected_components(), so that 0..n-1 is
+    already a topological order. Parallel edges between two components are merged, keeping the smallest weight.
+
+    Result: (component, dag), where component is the mapping from strongly_connected_components(). dag is a
+    CSRGraph if graph is one, otherwise a DirectedGraph.
+
+    >>> g = DirectedGraph({'a': {'b': 1}, 'b': {'a': 1, 'c': 4}, 'c': {'d': 1}, 'd': {'c': 1}, 'e': {'c': 2}})
+    >>> component, dag = condensation(g)
+    >>> sorted(component.items())
+    [('a', 1), ('b', 1), ('c', 2), ('d', 2), ('e', 0)]
+    >>> dag
+    <Directed {0: {2: 2}, 1: {2: 4}, 2: {}}>
+    """
+    csr = _csr(graph, weights=True)
+    n, component = _scc_csr(csr)
+    offsets = csr.offsets
+    targets = csr.targets
+    weights = csr.weights
+    edges = {}
+    for v in range(csr.n):
+        a = component[v]
+        for p in range(offsets[v], offsets[v + 1]):
+            b = component[targets[p]]
+            if a != b:
+                key = a * n + b
+                weight = weights[p]
+                if key not in edges or weight < edges[key]:
+                    edges[key] = weight
+    if csr is graph:
+        keys = list(edges)
+        dag = CSRGraph.from_edges(n, [key // n for key in keys], [key % n for key in keys], list(edges.values()))
+        return component, dag
+    dag = DirectedGraph()
+    dag.G = {i: {} for i in range(n)}
+    for key in sorted(edges):
+        dag.G[key // n][key % n] = edges[key]
+    return dict(zip(csr.labels, component)), dag
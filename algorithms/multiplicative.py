@@ -0,0 +1,150 @@
+#
+# Copyright 2012 Ralf Kistner
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+
+"""
+Tables of multiplicative functions (Euler's phi, Moebius, number and sum of divisors) for all n <= limit.
+
+Every table is an array indexed by n, with index 0 set to 0. Use numpy.frombuffer(table, ...) for a NumPy view
+without copying.
+
+The smallest prime factor table from primes.py is sieved first, with slice assignments in C. The tables are then
+filled in a single linear-sieve pass over n in Python: for n = p * m with p the smallest prime factor of n, f(n)
+follows from f(m) if p does not divide m, and otherwise from f(p^k) * f(n / p^k), where p^k is the largest power
+of p dividing n.
+"""
+
+from array import array
+
+from primes import smallest_prime_factors
+
+
+def multiplicative_table(limit, prime_power, typecode='q', spf=None):
+    """
+    Table of the multiplicative function f for all n <= limit, where prime_power(p, k, p^k) = f(p^k).
+
+    spf may be the result of smallest_prime_factors(limit), to share it between tables.
+
+    >>> list(multiplicative_table(10, lambda p, k, pk: k + 1))
+    [0, 1, 2, 2, 3, 2, 4, 2, 4, 3, 4]
+    """
+    if spf is None:
+        spf = smallest_prime_factors(limit)
+    table = array(typecode, bytes(array(typecode).itemsize * (limit + 1)))
+    # pk[n] is the largest power of the smallest prime factor of n that divides n, and exponent[n] its exponent
+    pk = array(spf.typecode, bytes(spf.itemsize * (limit + 1)))
+    exponent = array('B', bytes(limit + 1))
+    if limit >= 1:
+        table[1] = pk[1] = 1
+    for n in range(2, limit + 1):
+        p = spf[n]
+        m = n // p
+        if spf[m] == p:
+            q = pk[n] = pk[m] * p
+            if q == n:
+                k = exponent[n] = exponent[m] + 1
+                table[n] = prime_power(p, k, n)
+            else:
+                table[n] = table[q] * table[n // q]
+        else:
+            pk[n] = p
+            if m == 1:
+                exponent[n] = 1
+                table[n] = prime_power(p, 1, p)
+            else:
+                table[n] = table[p] * table[m]
+    return table
+
+
+def multiplicative_tables(limit):
+    """
+    Euler's phi, Moebius, number of divisors and sum of divisors for all n <= limit, in a single pass over n.
+
+    Returns the tuple (phi, mu, d, sigma) of arrays.
+
+    >>> phi, mu, d, sigma = multiplicative_tables(12)
+    >>> list(phi)
+    [0, 1, 1, 2, 2, 4, 2, 6, 4, 6, 4, 10, 4]
+    >>> list(mu)
+    [0, 1, -1, -1, 0, -1, 1, -1, 0, 0, 1, -1, 0]
+    >>> list(d)
+    [0, 1, 2, 2, 3, 2, 4, 2, 4, 3, 4, 2, 6]
+    >>> list(sigma)
+    [0, 1, 3, 4, 7, 6, 12, 8, 15, 13, 18, 12, 28]
+    """
+    spf = smallest_prime_factors(limit)
+    zeros = bytes(limit + 1)
+    pk = array(spf.typecode, zeros * spf.itemsize)
+    phi = array('Q', zeros * 8)
+    mu = array('b', zeros)
+    d = array('I', zeros * 4)
+    sigma = array('Q', zeros * 8)
+    if limit >= 1:
+        pk[1] = phi[1] = mu[1] = d[1] = sigma[1] = 1
+    for n in range(2, limit + 1):
+        p = spf[n]
+        m = n // p
+        if spf[m] == p:
+            # p divides m. mu[n] stays 0.
+            q = pk[n] = pk[m] * p
+            phi[n] = phi[m] * p
+            if q == n:
+                d[n] = d[m] + 1
+                sigma[n] = sigma[m] + n
+            else:
+                r = n // q
+                d[n] = d[q] * d[r]
+                sigma[n] = sigma[q] * sigma[r]
+        else:
+            # p and m are coprime, with m == 1 if n is prime
+            pk[n] = p
+            phi[n] = phi[m] * (p - 1)
+            mu[n] = -mu[m]
+            d[n] = d[m] * 2
+            sigma[n] = sigma[m] * (p + 1)
+    return phi, mu, d, sigma
+
+
+def totients(limit):
+    """
+    >>> list(totients(10))
+    [0, 1, 1, 2, 2, 4, 2, 6, 4, 6, 4]
+    """
+    return multiplicative_table(limit, lambda p, k, pk: pk - pk // p, 'Q')
+
+
+def mobius(limit):
+    """
+    >>> list(mobius(10))
+    [0, 1, -1, -1, 0, -1, 1, -1, 0, 0, 1]
+    """
+    return multiplicative_table(limit, lambda p, k, pk: -1 if k == 1 else 0, 'b')
+
+
+def divisor_counts(limit):
+    """
+    >>> list(divisor_counts(10))
+    [0, 1, 2, 2, 3, 2, 4, 2, 4, 3, 4]
+    """
+    return multiplicative_table(limit, lambda p, k, pk: k + 1, 'I')
+
+
+def divisor_sums(limit):
+    """
+    >>> list(divisor_sums(10))
+    [0, 1, 3, 4, 7, 6, 12, 8, 15, 13, 18]
+    """
+    return multiplicative_table(limit, lambda p, k, pk: (pk * p - 1) // (p - 1), 'Q')
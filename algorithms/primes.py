@@ -19,31 +19,364 @@
 Some functionality concerning prime numbers and number theory.
 """
 
-def calculate_primes(limit):
+import math
+import mmap
+import os
+import random
+import struct
+import sys
+import tempfile
+from array import array
+from bisect import bisect_right
+from itertools import compress, islice
+
+# Number of odd candidates sieved per block by generate_primes. One byte per candidate, so a block is 256KiB and
+# stays in the L2 cache.
+SEGMENT_SIZE = 1 << 18
+
+
+def calculate_primes(limit, segmented=False, cache=None):
     """
     Calculates all primes <= limit.
-    
+
+    Only odd numbers are stored, one byte each, and crossing off starts at i*i.
+    With segmented=True, the sieve runs in cache-sized blocks (see generate_primes), which is faster for large limits
+    and only needs O(sqrt(limit)) working memory apart from the result.
+
+    If cache is a file path, the primes are memory-mapped from that file instead (see load_primes), and the result is
+    a read-only memoryview rather than a list. It supports len(), indexing, slicing, iteration and bisect, but not
+    append(), + or == against a list; use list(result) for a list copy.
+
     >>> calculate_primes(10)
     [2, 3, 5, 7]
     >>> calculate_primes(3)
     [2, 3]
+    >>> calculate_primes(1)
+    []
+    >>> calculate_primes(100000) == calculate_primes(100000, segmented=True)
+    True
+    >>> import os, tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), 'primes.bin')
+    >>> cached = calculate_primes(10, cache=path)
+    >>> type(cached).__name__, list(cached)
+    ('memoryview', [2, 3, 5, 7])
+    >>> cached.release(); os.unlink(path)
     """
-    limit += 1
-    is_prime = [True]*limit
-    is_prime[0] = False
-    is_prime[1] = False
-    primes = []
-    for i in range(2, limit):
+    if cache is not None:
+        return load_primes(cache, limit)
+    if segmented:
+        return list(generate_primes(limit))
+    if limit < 2:
+        return []
+    # is_prime[i] represents the number 2*i + 1
+    size = (limit - 1) // 2 + 1
+    is_prime = bytearray([1]) * size
+    is_prime[0] = 0
+    for i in range(1, (math.isqrt(limit) - 1) // 2 + 1):
         if not is_prime[i]:
             continue
-        primes.append(i)
-        for j in range(2*i, limit, i):
-            is_prime[j] = False
+        p = 2 * i + 1
+        start = p * p // 2
+        is_prime[start::p] = bytes(len(range(start, size, p)))
+    primes = [2]
+    primes.extend(2 * i + 1 for i in compress(range(size), is_prime))
     return primes
-    
-def factorise(number, primes=None):
+
+
+def generate_primes(limit, segment_size=SEGMENT_SIZE):
+    """
+    Generates all primes <= limit in increasing order, using a segmented sieve over the odd numbers.
+
+    Only the primes up to sqrt(limit) and a single block of segment_size bytes are kept in memory, so this can be used
+    to stream primes up to 1e10 and beyond.
+
+    >>> list(generate_primes(30))
+    [2, 3, 5, 7, 11, 13, 17, 19, 23, 29]
+    >>> list(generate_primes(100, segment_size=4)) == calculate_primes(100)
+    True
+    >>> sum(1 for p in generate_primes(10**6))
+    78498
+    """
+    if limit < 2:
+        return
+    yield 2
+    base = calculate_primes(math.isqrt(limit))[1:]
+    size = (limit - 1) // 2 + 1
+    # Index i of a block represents the number 2*(low + i) + 1
+    for low in range(0, size, segment_size):
+        high = min(low + segment_size, size)
+        length = high - low
+        block = bytearray([1]) * length
+        if low == 0:
+            block[0] = 0
+        for p in base:
+            start = p * p // 2
+            if start >= high:
+                break
+            if start < low:
+                start = low + (start - low) % p
+            block[start - low::p] = bytes(len(range(start - low, length, p)))
+        odd = 2 * low + 1
+        for i in compress(range(length), block):
+            yield odd + 2 * i
+
+
+# Prime cache file format: a header followed by the primes as a packed array in native byte order.
+# The header holds the magic bytes, format version, array typecode, byte order, the limit sieved up to and the number
+# of primes stored. It is 32 bytes so that the data is aligned for 8-byte items.
+_CACHE_MAGIC = b'PRIMETAB'
+_CACHE_VERSION = 1
+_CACHE_HEADER = struct.Struct('<8sHcc4xQQ')
+
+
+def save_primes(path, limit):
+    """
+    Sieves all primes <= limit and writes them to a prime cache file at path.
+
+    The file is written to a temporary file first and then renamed, so that concurrent readers never see a partial
+    file.
+    """
+    typecode = 'I' if limit < 2 ** 32 else 'Q'
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.primes-')
+    try:
+        # fdopen first, so that the descriptor is closed if anything below fails
+        with os.fdopen(fd, 'wb') as f:
+            os.chmod(tmp, 0o644)
+            f.write(bytes(_CACHE_HEADER.size))
+            count = 0
+            primes = generate_primes(limit)
+            while True:
+                chunk = array(typecode, islice(primes, SEGMENT_SIZE))
+                if not chunk:
+                    break
+                chunk.tofile(f)
+                count += len(chunk)
+            f.seek(0)
+            f.write(_CACHE_HEADER.pack(_CACHE_MAGIC, _CACHE_VERSION, typecode.encode(), sys.byteorder[0].encode(),
+                                       limit, count))
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def _map_primes(path):
+    """ Maps a prime cache file, returning (limit, primes), or None if the file is missing or not valid. """
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(_CACHE_HEADER.size)
+            if len(header) < _CACHE_HEADER.size:
+                return None
+            magic, version, typecode, byteorder, limit, count = _CACHE_HEADER.unpack(header)
+            if (magic != _CACHE_MAGIC or version != _CACHE_VERSION or typecode not in (b'I', b'Q')
+                    or byteorder != sys.byteorder[0].encode()):
+                return None
+            typecode = typecode.decode()
+            end = _CACHE_HEADER.size + count * array(typecode).itemsize
+            if os.fstat(f.fileno()).st_size != end:
+                return None
+            if count == 0:
+                return limit, memoryview(array(typecode))
+            data = mmap.mmap(f.fileno(), end, access=mmap.ACCESS_READ)
+    except FileNotFoundError:
+        return None
+    return limit, memoryview(data)[_CACHE_HEADER.size:].cast(typecode)
+
+
+def load_primes(path, limit):
+    """
+    All primes <= limit, memory-mapped from the prime cache file at path.
+
+    The pages are shared between all processes that map the same file, so loading is instant and costs no extra
+    memory per process. If the file is missing, invalid, from another format version or sieved to less than limit,
+    it is rebuilt first.
+
+    The result is a read-only memoryview of integers, which can be indexed, sliced and iterated like a list.
+
+    >>> import tempfile, os
+    >>> path = os.path.join(tempfile.mkdtemp(), 'primes.bin')
+    >>> list(load_primes(path, 20))
+    [2, 3, 5, 7, 11, 13, 17, 19]
+    >>> list(load_primes(path, 10))
+    [2, 3, 5, 7]
+    >>> len(load_primes(path, 1000))
+    168
+    >>> with open(path, 'r+b') as f:
+    ...     _ = f.seek(10), f.write(b'x')
+    >>> len(load_primes(path, 1000))
+    168
+    >>> factorise(1009 * 1013, cache=path)
+    [(1009, 1), (1013, 1)]
+    """
+    mapped = _map_primes(path)
+    if mapped is None or mapped[0] < limit:
+        save_primes(path, limit)
+        mapped = _map_primes(path)
+    primes = mapped[1]
+    return primes[:bisect_right(primes, limit)]
+
+
+def _lucy_hedgehog(n, power):
+    """
+    Sum of p^power over all primes p <= n, using Lucy_Hedgehog's algorithm in O(n^(3/4)) time and O(sqrt(n)) memory.
+
+    For every value v = n // i, S(v) starts as the sum of m^power over 2 <= m <= v. Sieving by each prime p <= sqrt(n)
+    removes the composites with smallest factor p:  S(v) -= p^power * (S(v // p) - S(p - 1))
+    """
+    if n < 2:
+        return 0
+    r = math.isqrt(n)
+    if power == 0:
+        initial = lambda v: v - 1
+    else:
+        initial = lambda v: v * (v + 1) // 2 - 1
+    # small[v] = S(v) for v <= r, large[i] = S(n // i) for i <= r
+    small = [initial(v) for v in range(r + 1)]
+    small[0] = 0
+    large = [0] + [initial(n // i) for i in range(1, r + 1)]
+    for p in calculate_primes(r):
+        sp = small[p - 1]
+        weight = p ** power
+        p2 = p * p
+        end = min(r, n // p2)
+        split = min(end, r // p)
+        # Each new value only depends on values from before this round, so a whole range is rebuilt at once
+        large[1:end + 1] = ([large[i] - weight * (large[i * p] - sp) for i in range(1, split + 1)] +
+                            [large[i] - weight * (small[n // (i * p)] - sp) for i in range(split + 1, end + 1)])
+        if p2 <= r:
+            small[p2:] = [small[v] - weight * (small[v // p] - sp) for v in range(p2, r + 1)]
+    return large[1]
+
+
+def prime_count(n):
+    """
+    The number of primes <= n, in O(n^(3/4)) time and O(sqrt(n)) memory.
+
+    >>> prime_count(10)
+    4
+    >>> prime_count(1)
+    0
+    >>> prime_count(10 ** 9)
+    50847534
+    """
+    return _lucy_hedgehog(n, 0)
+
+
+def prime_sum(n):
+    """
+    The sum of all primes <= n, in O(n^(3/4)) time and O(sqrt(n)) memory.
+
+    >>> prime_sum(10)
+    17
+    >>> prime_sum(2 * 10 ** 6)
+    142913828922
+    """
+    return _lucy_hedgehog(n, 1)
+
+
+# factorise() without a list of primes trial divides by the primes below TRIAL_LIMIT, and then switches to
+# is_prime and pollard_brent for what remains.
+TRIAL_LIMIT = 1000
+_SMALL_PRIMES = calculate_primes(TRIAL_LIMIT)
+
+# Witnesses that make is_prime deterministic for all n < 3.3 * 10^24, which covers all 64-bit integers.
+_MILLER_RABIN_BASES = (2, 3, 5, 7, 11, 13, 17, 19, 23, 29, 31, 37)
+
+
+def is_prime(number):
+    """
+    Miller-Rabin primality test.
+
+    Deterministic for number < 3.3 * 10^24, and a strong probable prime test beyond that.
+
+    >>> [n for n in range(30) if is_prime(n)]
+    [2, 3, 5, 7, 11, 13, 17, 19, 23, 29]
+    >>> is_prime(2 ** 61 - 1)
+    True
+    >>> is_prime(3215031751)  # strong pseudoprime to bases 2, 3, 5 and 7
+    False
+    """
+    if number < 2:
+        return False
+    for p in _MILLER_RABIN_BASES:
+        if number % p == 0:
+            return number == p
+    d = number - 1
+    s = 0
+    while d % 2 == 0:
+        d //= 2
+        s += 1
+    for a in _MILLER_RABIN_BASES:
+        x = pow(a, d, number)
+        if x == 1 or x == number - 1:
+            continue
+        for _ in range(s - 1):
+            x = x * x % number
+            if x == number - 1:
+                break
+        else:
+            return False
+    return True
+
+
+def pollard_brent(number):
+    """
+    Finds a non-trivial factor of a composite number, using Brent's variant of Pollard's rho algorithm.
+
+    The expected running time is O(n^(1/4)) multiplications. The factor is not necessarily prime.
+    Does not terminate if number is prime.
+
+    >>> pollard_brent(1000003 * 999983) in (1000003, 999983)
+    True
+    """
+    if number % 2 == 0:
+        return 2
+    m = 128
+    while True:
+        y = random.randrange(1, number)
+        c = random.randrange(1, number)
+        g = r = q = 1
+        while g == 1:
+            x = y
+            for _ in range(r):
+                y = (y * y + c) % number
+            k = 0
+            while k < r and g == 1:
+                ys = y
+                for _ in range(min(m, r - k)):
+                    y = (y * y + c) % number
+                    q = q * abs(x - y) % number
+                g = math.gcd(q, number)
+                k += m
+            r *= 2
+        if g == number:
+            # The batched gcd overshot; redo the last batch one step at a time
+            g = 1
+            while g == 1:
+                ys = (ys * ys + c) % number
+                g = math.gcd(abs(x - ys), number)
+        if g != number:
+            return g
+
+
+def _prime_factors(number, result):
+    if is_prime(number):
+        result.append(number)
+        return
+    d = pollard_brent(number)
+    _prime_factors(d, result)
+    _prime_factors(number // d, result)
+
+
+def factorise(number, primes=None, cache=None):
     """
     Given a sorted list of primes, factorises a number.
+
+    If primes is not given, small factors are found by trial division and the rest with is_prime and pollard_brent,
+    so that any 64-bit number is factorised in milliseconds.
+
+    If cache is a prime cache file path (see load_primes), the primes up to sqrt(number) are read from it instead.
     
     >>> factorise(5)
     [(5, 1)]
@@ -53,14 +386,19 @@ def factorise(number, primes=None):
     [(2, 2), (3, 1)]
     >>> factorise(39, [2, 3, 5, 7])
     [(3, 1), (13, 1)]
+    >>> factorise(1000000007 * 998244353 * 7 ** 2)
+    [(7, 2), (998244353, 1), (1000000007, 1)]
+    >>> factorise(997 ** 2)
+    [(997, 2)]
     
     Note the result of the following example, where 5 is not in the provided list of primes.
     >>> factorise(75, [2, 3])
     [(3, 1), (25, 1)]
     """
+    if cache is not None:
+        primes = load_primes(cache, math.isqrt(number))
     if primes is None:
-        import math
-        primes = calculate_primes(int(math.sqrt(number)))
+        return _factorise_large(number)
     
     factors = []
     for p in primes:
@@ -75,4 +413,108 @@ def factorise(number, primes=None):
     # This last check allows us to factorise numbers up to p^2 with only pre-calculated primes up to p
     if number > 1:
         factors.append((number, 1))
-    return factors
\ No newline at end of file
+    return factors
+
+
+def _factorise_large(number):
+    factors = []
+    for p in _SMALL_PRIMES:
+        if p * p > number:
+            # What remains is 1 or a prime
+            if number > 1:
+                factors.append((number, 1))
+            return factors
+        count = 0
+        while number % p == 0:
+            number //= p
+            count += 1
+        if count > 0:
+            factors.append((p, count))
+    # All remaining factors are > TRIAL_LIMIT, so trial division no longer pays off
+    large = []
+    if number > 1:
+        _prime_factors(number, large)
+    large.sort()
+    for p in large:
+        if factors and factors[-1][0] == p:
+            factors[-1] = (p, factors[-1][1] + 1)
+        else:
+            factors.append((p, 1))
+    return factors
+
+
+def smallest_prime_factors(limit):
+    """
+    Calculates the smallest prime factor of every number <= limit, as an array indexed by the number.
+
+    Index 0 and 1 contain 0 and 1. Every prime p maps to itself.
+
+    The table is filled by sieving with slice assignments from the largest prime down, so that smaller primes
+    overwrite larger ones. This does the same O(n log log n) work as the sieve, but in C rather than in a per-number
+    Python loop like a linear sieve would.
+
+    >>> list(smallest_prime_factors(12))
+    [0, 1, 2, 3, 2, 5, 2, 7, 2, 3, 2, 11, 2]
+    """
+    typecode = 'I' if limit < 2 ** 32 else 'Q'
+    spf = array(typecode, range(limit + 1))
+    for p in reversed(calculate_primes(math.isqrt(limit))):
+        start = p * p
+        spf[start::p] = array(typecode, [p]) * len(range(start, limit + 1, p))
+    return spf
+
+
+def _factorise_spf(number, spf):
+    factors = []
+    while number > 1:
+        p = spf[number]
+        count = 0
+        while number % p == 0:
+            number //= p
+            count += 1
+        factors.append((p, count))
+    return factors
+
+
+def factorise_many(numbers, spf=None):
+    """
+    Factorises each of the given numbers, using a smallest prime factor table (see smallest_prime_factors).
+
+    If spf is not given, a table up to the largest number is built once for the whole batch. Each number is then
+    factorised in O(log n).
+
+    >>> factorise_many([12, 13, 1, 360])
+    [[(2, 2), (3, 1)], [(13, 1)], [], [(2, 3), (3, 2), (5, 1)]]
+    """
+    numbers = list(numbers)
+    if spf is None:
+        spf = smallest_prime_factors(max(numbers, default=1))
+    return [_factorise_spf(n, spf) for n in numbers]
+
+
+class Factoriser(object):
+    """
+    Keeps a smallest prime factor table up to limit, so that repeated factorisations do not need to sieve again.
+
+    Numbers <= limit are factorised in O(log n) from the table. Larger numbers fall back to factorise().
+
+    >>> f = Factoriser(100)
+    >>> f.factorise(84)
+    [(2, 2), (3, 1), (7, 1)]
+    >>> f.factorise(101 * 4)
+    [(2, 2), (101, 1)]
+    >>> f.factorise_many([6, 7])
+    [[(2, 1), (3, 1)], [(7, 1)]]
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.spf = smallest_prime_factors(limit)
+
+    def factorise(self, number):
+        if number <= self.limit:
+            return _factorise_spf(number, self.spf)
+        return factorise(number)
+
+    def factorise_many(self, numbers):
+        return [self.factorise(n) for n in numbers]
@@ -0,0 +1,452 @@
+#
+# Copyright 2012 Ralf Kistner
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+
+"""
+Spatial indexes for nearest neighbour and range queries on sets of geometry.Vector points.
+
+KDTree is built once from all the points and answers k-nearest, radius and rectangle queries in O(log n) plus the
+size of the output for well spread points. GridIndex hashes the points into square cells, which is simpler and
+allows adding points, and works best when the cell size is close to the query radius.
+"""
+
+import math
+
+from geometry import Vector
+
+
+# The number of points below which a range of the KDTree is scanned instead of split
+LEAF_SIZE = 8
+
+
+def _kdtree_order_numpy(xs, ys, ranges):
+    """
+    Orders the points for KDTree, one depth of the tree at a time: a single argsort of the key range start * n +
+    coordinate rank sorts every range that is split at that depth.
+    """
+    import numpy
+
+    n = len(xs)
+    ranks = []
+    for values in (xs, ys):
+        rank = numpy.empty(n, dtype=numpy.int64)
+        rank[numpy.argsort(numpy.asarray(values), kind='stable')] = numpy.arange(n)
+        ranks.append(rank)
+    order = numpy.arange(n)
+    axis = 0
+    while ranges:
+        starts = numpy.array([lo for lo, hi in ranges])
+        lengths = numpy.array([hi - lo for lo, hi in ranges])
+        # The positions covered by the ranges, and the start of the range of each of them
+        owner = numpy.repeat(starts, lengths)
+        positions = owner + numpy.arange(len(owner)) - numpy.repeat(numpy.cumsum(lengths) - lengths, lengths)
+        selected = order[positions]
+        order[positions] = selected[numpy.argsort(owner * n + ranks[axis][selected])]
+        ranges = _split_ranges(ranges)
+        axis ^= 1
+    return order.tolist()
+
+
+def _kdtree_order(xs, ys, ranges):
+    """ Orders the points for KDTree by sorting each range that is split, in pure Python. """
+    order = list(range(len(xs)))
+    coords = (xs, ys)
+    axis = 0
+    while ranges:
+        key = coords[axis].__getitem__
+        for lo, hi in ranges:
+            order[lo:hi] = sorted(order[lo:hi], key=key)
+        ranges = _split_ranges(ranges)
+        axis ^= 1
+    return order
+
+
+def _split_ranges(ranges):
+    """ The ranges of the children of the given KDTree ranges that are split further. """
+    result = []
+    for lo, hi in ranges:
+        mid = (lo + hi) // 2
+        if mid - lo > LEAF_SIZE:
+            result.append((lo, mid))
+        if hi - mid - 1 > LEAF_SIZE:
+            result.append((mid + 1, hi))
+    return result
+
+
+class KDTree(object):
+    """
+    A 2-d tree, stored implicitly in flat arrays: the range lo..hi-1 of the sorted points is split at its middle
+    point mid, into lo..mid-1 and mid+1..hi-1, alternately by x and by y. Ranges of at most LEAF_SIZE points are
+    scanned.
+
+    With NumPy, each depth of the tree is sorted by one vectorised argsort. Without it, each range is sorted with
+    sorted(). Queries run in Python over array('d') coordinates.
+
+    >>> points = [Vector(x, y) for x in range(10) for y in range(10)]
+    >>> tree = KDTree(points)
+    >>> distance, point = tree.nearest(Vector(3.2, 4.4))
+    >>> round(distance, 3), point
+    (0.447, (3.000, 4.000))
+    >>> [p for d, p in tree.k_nearest(Vector(0, 0), 3)]
+    [(0.000, 0.000), (0.000, 1.000), (1.000, 0.000)]
+    >>> tree.k_nearest(Vector(0, 0), 0)
+    []
+    >>> sorted(tree.within(Vector(5, 5), 1), key=tuple)
+    [(4.000, 5.000), (5.000, 4.000), (5.000, 5.000), (5.000, 6.000), (6.000, 5.000)]
+    >>> sorted(tree.rectangle(Vector(1.5, 2), Vector(3, 3.5)), key=tuple)
+    [(2.000, 2.000), (2.000, 3.000), (3.000, 2.000), (3.000, 3.000)]
+    """
+
+    def __init__(self, points):
+        from array import array
+
+        self.points = points = list(points)
+        n = len(points)
+        xs = [p.x for p in points]
+        ys = [p.y for p in points]
+        ranges = [(0, n)] if n > LEAF_SIZE else []
+        try:
+            import numpy
+        except ImportError:
+            numpy = None
+        if numpy is not None:
+            order = _kdtree_order_numpy(xs, ys, ranges)
+        else:
+            order = _kdtree_order(xs, ys, ranges)
+        self.order = array('i' if n < 2 ** 31 else 'q', order)
+        self.xs = array('d', map(xs.__getitem__, order))
+        self.ys = array('d', map(ys.__getitem__, order))
+
+    def __len__(self):
+        return len(self.points)
+
+    def k_nearest(self, point, k):
+        """ The k points nearest to point, as a list of (distance, point) in order of increasing distance. """
+        import heapq
+
+        px = point.x
+        py = point.y
+        xs = self.xs
+        ys = self.ys
+        # A max-heap of (-squared distance, position) of the best points so far
+        best = []
+        if k <= 0:
+            return best
+        stack = [(0, len(xs), 0, 0.0)]
+        while stack:
+            lo, hi, axis, bound = stack.pop()
+            if len(best) == k and bound >= -best[0][0]:
+                continue
+            if hi - lo <= LEAF_SIZE:
+                for i in range(lo, hi):
+                    dx = xs[i] - px
+                    dy = ys[i] - py
+                    d = dx * dx + dy * dy
+                    if len(best) < k:
+                        heapq.heappush(best, (-d, i))
+                    elif d < -best[0][0]:
+                        heapq.heapreplace(best, (-d, i))
+                continue
+            mid = (lo + hi) // 2
+            dx = xs[mid] - px
+            dy = ys[mid] - py
+            d = dx * dx + dy * dy
+            if len(best) < k:
+                heapq.heappush(best, (-d, mid))
+            elif d < -best[0][0]:
+                heapq.heapreplace(best, (-d, mid))
+            diff = dx if axis == 0 else dy
+            # The far side is pushed first, so that the near side is searched first
+            if diff > 0:
+                stack.append((mid + 1, hi, axis ^ 1, diff * diff))
+                stack.append((lo, mid, axis ^ 1, bound))
+            else:
+                stack.append((lo, mid, axis ^ 1, diff * diff))
+                stack.append((mid + 1, hi, axis ^ 1, bound))
+        best.sort(reverse=True)
+        points = self.points
+        order = self.order
+        return [(math.sqrt(-d), points[order[i]]) for d, i in best]
+
+    def nearest(self, point):
+        """ The point nearest to point, as (distance, point). """
+        return self.k_nearest(point, 1)[0]
+
+    def within(self, point, r):
+        """ All points at distance at most r from point, in no particular order. """
+        px = point.x
+        py = point.y
+        r2 = r * r
+        xs = self.xs
+        ys = self.ys
+        found = []
+        stack = [(0, len(xs), 0)]
+        while stack:
+            lo, hi, axis = stack.pop()
+            if hi - lo <= LEAF_SIZE:
+                for i in range(lo, hi):
+                    dx = xs[i] - px
+                    dy = ys[i] - py
+                    if dx * dx + dy * dy <= r2:
+                        found.append(i)
+                continue
+            mid = (lo + hi) // 2
+            dx = xs[mid] - px
+            dy = ys[mid] - py
+            if dx * dx + dy * dy <= r2:
+                found.append(mid)
+            diff = dx if axis == 0 else dy
+            if diff >= -r:
+                stack.append((lo, mid, axis ^ 1))
+            if diff <= r:
+                stack.append((mid + 1, hi, axis ^ 1))
+        points = self.points
+        order = self.order
+        return [points[order[i]] for i in found]
+
+    def rectangle(self, low, high):
+        """ All points p with low.x <= p.x <= high.x and low.y <= p.y <= high.y, in no particular order. """
+        x0, y0 = low.x, low.y
+        x1, y1 = high.x, high.y
+        xs = self.xs
+        ys = self.ys
+        found = []
+        stack = [(0, len(xs), 0)]
+        while stack:
+            lo, hi, axis = stack.pop()
+            if hi - lo <= LEAF_SIZE:
+                for i in range(lo, hi):
+                    if x0 <= xs[i] <= x1 and y0 <= ys[i] <= y1:
+                        found.append(i)
+                continue
+            mid = (lo + hi) // 2
+            x = xs[mid]
+            y = ys[mid]
+            if x0 <= x <= x1 and y0 <= y <= y1:
+                found.append(mid)
+            if axis == 0:
+                low_side, high_side = x0 <= x, x <= x1
+            else:
+                low_side, high_side = y0 <= y, y <= y1
+            if low_side:
+                stack.append((lo, mid, axis ^ 1))
+            if high_side:
+                stack.append((mid + 1, hi, axis ^ 1))
+        points = self.points
+        order = self.order
+        return [points[order[i]] for i in found]
+
+
+class GridIndex(object):
+    """
+    A uniform grid of square cells of the given size, hashed into a dictionary of cells. Points can be added at
+    any time.
+
+    The default cell size gives about two points per cell over the bounding box of the initial points.
+
+    >>> grid = GridIndex([Vector(x, y) for x in range(10) for y in range(10)], cell=2)
+    >>> grid.add(Vector(4.5, 4.5))
+    >>> distance, point = grid.nearest(Vector(4.6, 4.4))
+    >>> round(distance, 3), point
+    (0.141, (4.500, 4.500))
+    >>> sorted(grid.within(Vector(0, 0), 1), key=tuple)
+    [(0.000, 0.000), (0.000, 1.000), (1.000, 0.000)]
+    >>> len(grid.rectangle(Vector(0, 0), Vector(9, 1)))
+    20
+    """
+
+    def __init__(self, points=(), cell=None):
+        points = list(points)
+        if cell is None:
+            if len(points) > 1:
+                width = max(p.x for p in points) - min(p.x for p in points)
+                height = max(p.y for p in points) - min(p.y for p in points)
+                cell = math.sqrt(2.0 * max(width * height, width * width, height * height) / len(points))
+            cell = cell or 1.0
+        self.cell = cell
+        self.cells = {}
+        self.count = 0
+        # The range of the occupied cells
+        self.bounds = None
+        for point in points:
+            self.add(point)
+
+    def _key(self, x, y):
+        return int(math.floor(x / self.cell)), int(math.floor(y / self.cell))
+
+    def add(self, point):
+        key = self._key(point.x, point.y)
+        cell = self.cells.get(key)
+        if cell is None:
+            self.cells[key] = [point]
+            cx, cy = key
+            if self.bounds is None:
+                self.bounds = (cx, cy, cx, cy)
+            else:
+                x0, y0, x1, y1 = self.bounds
+                self.bounds = (min(x0, cx), min(y0, cy), max(x1, cx), max(y1, cy))
+        else:
+            cell.append(point)
+        self.count += 1
+
+    def __len__(self):
+        return self.count
+
+    def rectangle(self, low, high):
+        """ All points p with low.x <= p.x <= high.x and low.y <= p.y <= high.y, in no particular order. """
+        x0, y0 = low.x, low.y
+        x1, y1 = high.x, high.y
+        cx0, cy0 = self._key(x0, y0)
+        cx1, cy1 = self._key(x1, y1)
+        cells = self.cells
+        found = []
+        if (cx1 - cx0 + 1) * (cy1 - cy0 + 1) > len(cells):
+            # Fewer occupied cells than cells in the rectangle
+            keys = [key for key in cells if cx0 <= key[0] <= cx1 and cy0 <= key[1] <= cy1]
+        else:
+            keys = [(cx, cy) for cx in range(cx0, cx1 + 1) for cy in range(cy0, cy1 + 1)]
+        for key in keys:
+            for p in cells.get(key, ()):
+                if x0 <= p.x <= x1 and y0 <= p.y <= y1:
+                    found.append(p)
+        return found
+
+    def within(self, point, r):
+        """ All points at distance at most r from point, in no particular order. """
+        px = point.x
+        py = point.y
+        r2 = r * r
+        found = []
+        for p in self.rectangle(Vector(px - r, py - r), Vector(px + r, py + r)):
+            dx = p.x - px
+            dy = p.y - py
+            if dx * dx + dy * dy <= r2:
+                found.append(p)
+        return found
+
+    def k_nearest(self, point, k):
+        """
+        The k points nearest to point, as a list of (distance, point) in order of increasing distance. Searches
+        rings of cells around the cell of point, until the next ring cannot contain anything closer.
+        """
+        import heapq
+
+        px = point.x
+        py = point.y
+        cx, cy = self._key(px, py)
+        cells = self.cells
+        cell = self.cell
+        k = min(k, self.count)
+        best = []
+        if k <= 0:
+            return best
+        counter = 0
+        x0, y0, x1, y1 = self.bounds
+        # The rings closer than the occupied cells are empty
+        ring = max(0, x0 - cx, cx - x1, y0 - cy, cy - y1)
+        while True:
+            if ring == 0:
+                keys = [(cx, cy)]
+            else:
+                keys = [(cx + dx, cy + dy) for dx in range(-ring, ring + 1) for dy in (-ring, ring)]
+                keys.extend((cx + dx, cy + dy) for dx in (-ring, ring) for dy in range(1 - ring, ring))
+            for key in keys:
+                for p in cells.get(key, ()):
+                    dx = p.x - px
+                    dy = p.y - py
+                    d = dx * dx + dy * dy
+                    counter += 1
+                    if len(best) < k:
+                        heapq.heappush(best, (-d, counter, p))
+                    elif d < -best[0][0]:
+                        heapq.heapreplace(best, (-d, counter, p))
+            # Every point outside the searched rings is farther than this
+            reach = ring * cell + min(px - cx * cell, (cx + 1) * cell - px, py - cy * cell, (cy + 1) * cell - py)
+            if len(best) == k and reach * reach >= -best[0][0]:
+                break
+            if cx - ring <= x0 and cx + ring >= x1 and cy - ring <= y0 and cy + ring >= y1:
+                # All occupied cells have been searched
+                break
+            ring += 1
+        best.sort(key=lambda item: (-item[0], item[1]))
+        return [(math.sqrt(-d), p) for d, _, p in best]
+
+    def nearest(self, point):
+        """ The point nearest to point, as (distance, point). Raises IndexError if the grid is empty. """
+        return self.k_nearest(point, 1)[0]
+
+
+def closest_pair(points):
+    """
+    The two closest points, by divide and conquer over the points sorted by x, in O(n log n). Each half returns its
+    points sorted by y, and the two runs are merged by a stable sort, which takes linear time for two runs.
+
+    Returns (distance, a, b).
+
+    >>> closest_pair([Vector(0, 0), Vector(5, 1), Vector(3, 4), Vector(5, 2.5), Vector(9, 9)])
+    (1.5, (5.000, 1.000), (5.000, 2.500))
+    """
+    points = sorted(points, key=lambda p: (p.x, p.y))
+    if len(points) < 2:
+        raise ValueError("closest_pair needs at least two points")
+    xs = [p.x for p in points]
+    ys = [p.y for p in points]
+    by_y = ys.__getitem__
+
+    def search(lo, hi):
+        """ (squared distance, (i, j), indices lo..hi-1 sorted by y) for the closest pair i < j in lo..hi-1. """
+        if hi - lo <= 3:
+            best = float('inf')
+            pair = None
+            for i in range(lo, hi):
+                for j in range(i + 1, hi):
+                    dx = xs[j] - xs[i]
+                    dy = ys[j] - ys[i]
+                    d = dx * dx + dy * dy
+                    if d < best:
+                        best = d
+                        pair = (i, j)
+            return best, pair, sorted(range(lo, hi), key=by_y)
+        mid = (lo + hi) // 2
+        middle = xs[mid]
+        best, pair, merged = search(lo, mid)
+        right_best, right_pair, right = search(mid, hi)
+        if right_best < best:
+            best, pair = right_best, right_pair
+        merged += right
+        merged.sort(key=by_y)
+        # Only points closer to the dividing line than the best distance can form a closer pair across it
+        delta = math.sqrt(best)
+        strip = [i for i in merged if middle - delta < xs[i] < middle + delta]
+        for a in range(len(strip) - 1):
+            i = strip[a]
+            x = xs[i]
+            y = ys[i]
+            for b in range(a + 1, len(strip)):
+                j = strip[b]
+                dy = ys[j] - y
+                if dy >= delta:
+                    break
+                dx = xs[j] - x
+                d = dx * dx + dy * dy
+                if d < best:
+                    best = d
+                    pair = (i, j) if i < j else (j, i)
+                    delta = math.sqrt(best)
+        return best, pair, merged
+
+    best, (i, j), _ = search(0, len(points))
+    return math.sqrt(best), points[i], points[j]
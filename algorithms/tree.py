@@ -0,0 +1,202 @@
+#
+# Copyright 2012 Ralf Kistner
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+
+"""
+Queries on rooted trees, such as the shortest path trees given by the predecessors of dijkstra().
+
+Nodes are mapped to the integers 0..n-1, and the tree is stored in flat arrays. Binary lifting keeps the 2^j-th
+ancestor of every node for each j, so that lowest common ancestor and k-th ancestor queries take O(log n) after
+O(n log n) preprocessing, instead of walking the predecessors.
+"""
+
+
+class TreeIndex(object):
+    """
+    Lowest common ancestor, k-th ancestor and path distance queries on a rooted forest.
+
+    `parents` maps each node to its parent; nodes that are not in parents are roots, as is `root` if given. Pass
+    root=start for the predecessors of dijkstra(G, start), which include a predecessor of start if a cycle leads
+    back to it. `distances` optionally gives the weighted distance from the root to each node, as returned by
+    dijkstra(). Without it, every edge has length 1.
+
+    Raises ValueError if the parents contain a cycle.
+
+    >>> from graph import DirectedGraph, dijkstra
+    >>> G = DirectedGraph({'s': {'a': 2, 'b': 1}, 'a': {'c': 1, 'd': 4}, 'b': {'e': 3}})
+    >>> distances, predecessors = dijkstra(G, 's')
+    >>> tree = TreeIndex(predecessors, distances, root='s')
+    >>> tree.lca('c', 'd'), tree.lca('d', 'e'), tree.lca('a', 'c')
+    ('a', 's', 'a')
+    >>> tree.distance('c', 'e'), tree.distance('c', 'd'), tree.depth('d')
+    (7, 5, 2)
+    >>> tree.kth_ancestor('d', 1), tree.kth_ancestor('d', 2), tree.kth_ancestor('d', 3)
+    ('a', 's', None)
+    >>> tree.path('c', 'e')
+    ['c', 'a', 's', 'b', 'e']
+    """
+
+    def __init__(self, parents, distances=None, root=None):
+        from array import array
+
+        nodes = list(parents)
+        if root is not None and root not in parents:
+            nodes.append(root)
+        ids = {node: i for i, node in enumerate(nodes)}
+        for parent in parents.values():
+            if parent not in ids:
+                ids[parent] = len(nodes)
+                nodes.append(parent)
+        n = len(nodes)
+        typecode = 'i' if n < 2 ** 31 else 'q'
+
+        # Roots are their own parent
+        parent = array(typecode, range(n))
+        for node, p in parents.items():
+            parent[ids[node]] = ids[p]
+        if root is not None:
+            parent[ids[root]] = ids[root]
+
+        # Depths, walking up from each node only until a node with a known depth
+        depth = array(typecode, [-1]) * n
+        for i in range(n):
+            chain = []
+            while depth[i] < 0:
+                if parent[i] == i:
+                    depth[i] = 0
+                    break
+                chain.append(i)
+                if len(chain) > n:
+                    raise ValueError("parents contain a cycle")
+                i = parent[i]
+            d = depth[i]
+            while chain:
+                d += 1
+                depth[chain.pop()] = d
+
+        if distances is None:
+            self.distances = depth
+        else:
+            self.distances = [0 if parent[i] == i else distances[node] for i, node in enumerate(nodes)]
+
+        # up[j][i] is the 2^j-th ancestor of i, or the root of i if it is closer
+        up = [parent]
+        for j in range(1, max(max(depth, default=0), 1).bit_length()):
+            previous = up[-1]
+            up.append(array(typecode, map(previous.__getitem__, previous)))
+
+        self.nodes = nodes
+        self.ids = ids
+        self.parent = parent
+        self._depth = depth
+        self.up = up
+
+    @classmethod
+    def from_graph(cls, graph, root):
+        """
+        Builds the index for a tree given as a Graph, rooted at root. The edges may be directed away from the root
+        or go both ways, as in an UndirectedGraph; edge weights are the distances.
+
+        >>> from graph import UndirectedGraph
+        >>> tree = TreeIndex.from_graph(UndirectedGraph({1: {2: 3, 3: 1}, 3: {4: 1, 5: 2}}), 1)
+        >>> tree.lca(4, 5), tree.lca(2, 5), tree.distance(2, 5), tree.kth_ancestor(5, 2)
+        (3, 1, 6, 1)
+        """
+        parents = {}
+        distances = {root: 0}
+        stack = [root]
+        while stack:
+            node = stack.pop()
+            for neighbour, weight in graph.edges(node).items():
+                if neighbour not in distances:
+                    parents[neighbour] = node
+                    distances[neighbour] = distances[node] + weight
+                    stack.append(neighbour)
+        return cls(parents, distances, root)
+
+    def depth(self, node):
+        """ The number of edges between node and its root. """
+        return self._depth[self.ids[node]]
+
+    def _ancestor(self, i, k):
+        up = self.up
+        j = 0
+        while k:
+            if k & 1:
+                i = up[j][i]
+            k >>= 1
+            j += 1
+        return i
+
+    def kth_ancestor(self, node, k):
+        """ The ancestor k edges above node, or None if node is less than k deep. """
+        i = self.ids[node]
+        if k > self._depth[i]:
+            return None
+        return self.nodes[self._ancestor(i, k)]
+
+    def _lca(self, a, b):
+        depth = self._depth
+        if depth[a] < depth[b]:
+            a, b = b, a
+        a = self._ancestor(a, depth[a] - depth[b])
+        if a == b:
+            return a
+        for level in reversed(self.up):
+            if level[a] != level[b]:
+                a = level[a]
+                b = level[b]
+        a = self.parent[a]
+        if a != self.parent[b]:
+            # Different trees of the forest
+            return None
+        return a
+
+    def lca(self, a, b):
+        """ The lowest common ancestor of a and b, or None if they are in different trees. """
+        i = self._lca(self.ids[a], self.ids[b])
+        if i is None:
+            return None
+        return self.nodes[i]
+
+    def distance(self, a, b):
+        """ The length of the tree path between a and b, or None if they are in different trees. """
+        i = self.ids[a]
+        j = self.ids[b]
+        c = self._lca(i, j)
+        if c is None:
+            return None
+        distances = self.distances
+        return distances[i] + distances[j] - 2 * distances[c]
+
+    def path(self, a, b):
+        """ The nodes on the tree path from a to b, or None if they are in different trees. O(length of path). """
+        i = self.ids[a]
+        j = self.ids[b]
+        c = self._lca(i, j)
+        if c is None:
+            return None
+        parent = self.parent
+        up = [i]
+        while i != c:
+            i = parent[i]
+            up.append(i)
+        down = []
+        while j != c:
+            down.append(j)
+            j = parent[j]
+        down.reverse()
+        return [self.nodes[k] for k in up + down]